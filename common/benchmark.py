@@ -0,0 +1,306 @@
+"""
+Benchmark harness for the vector stores used in this repository.
+
+Measures index build time, p50/p95/p99 query latency after a warmup, queries per
+second under concurrency and recall@k against an exact search. A deterministic
+hashing embedding model is used so the benchmark runs offline and results are
+comparable across commits. Run it from the repository root:
+
+    python -m common.benchmark --stores faiss local --output bench.json
+
+PGVector is included when PGVECTOR_CONNECTION_STRING is set and Pinecone when
+PINECONE_API_KEY and PINECONE_ENV are set.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_DATA = (
+    "data/The Project Gutenberg eBook of A Christmas Carol in Prose; "
+    "Being a Ghost Story of Christmas.txt"
+)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic offline embeddings. Each word is hashed to a signed dimension, so
+    texts that share words get similar vectors, like a real model would.
+    """
+
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+
+    def embed_query(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+# --------------------------------------------------------------
+# Measurements
+# --------------------------------------------------------------
+
+
+def latency_stats(samples):
+    """Summarizes latency samples in seconds as milliseconds."""
+    samples_ms = np.array(samples) * 1000
+    return {
+        "runs": len(samples),
+        "mean_ms": float(samples_ms.mean()),
+        "p50_ms": float(np.percentile(samples_ms, 50)),
+        "p95_ms": float(np.percentile(samples_ms, 95)),
+        "p99_ms": float(np.percentile(samples_ms, 99)),
+        "max_ms": float(samples_ms.max()),
+    }
+
+
+def measure_latency(func, inputs, warmup=3):
+    """Calls func once per input, after a few untimed warmup calls, and returns latency stats."""
+    inputs = list(inputs)
+    for i in range(min(warmup, len(inputs))):
+        func(inputs[i])
+
+    samples = []
+    for value in inputs:
+        start = time.perf_counter()
+        func(value)
+        samples.append(time.perf_counter() - start)
+    return latency_stats(samples)
+
+
+def measure_throughput(func, inputs, concurrency=4):
+    """Calls func for every input on a thread pool and returns the queries per second."""
+    inputs = list(inputs)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        list(executor.map(func, inputs))
+        elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "queries": len(inputs),
+        "qps": len(inputs) / elapsed,
+    }
+
+
+def exact_top_k(query_vectors, doc_vectors, k):
+    """Returns the indices of the k most cosine-similar documents for each query."""
+    queries = np.asarray(query_vectors, dtype=np.float32)
+    docs = np.asarray(doc_vectors, dtype=np.float32)
+    queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    docs /= np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    scores = queries @ docs.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall_at_k(retrieved, expected):
+    """Mean fraction of the expected results that were retrieved, per query."""
+    recalls = [
+        len(set(found) & set(truth)) / len(truth)
+        for found, truth in zip(retrieved, expected)
+        if len(truth)
+    ]
+    return float(np.mean(recalls)) if recalls else 0.0
+
+
+# --------------------------------------------------------------
+# Vector stores
+# --------------------------------------------------------------
+
+
+def build_faiss(docs, embeddings):
+    from langchain.vectorstores import FAISS
+
+    return FAISS.from_documents(docs, embeddings)
+
+
+def build_local(docs, embeddings):
+    from common.local_vectorstore import LocalVectorStore
+
+    return LocalVectorStore.from_documents(docs, embeddings, path=tempfile.mkdtemp())
+
+
+def build_pgvector(docs, embeddings):
+    import sys
+
+    sys.path.append(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pgvector")
+    )
+    from pgvector_service import PgvectorService
+
+    class PgvectorSearch:
+        """Gives PgvectorService the similarity_search surface of the other stores."""
+
+        collection_name = "benchmark"
+
+        def __init__(self):
+            self.service = PgvectorService(
+                os.environ["PGVECTOR_CONNECTION_STRING"],
+                embedding_dimensions=embeddings.dimensions,
+                embeddings=embeddings,
+            )
+            self.service.update_pgvector_collection(
+                docs, self.collection_name, overwrite=True
+            )
+
+        def similarity_search(self, query, k=4):
+            results = self.service.custom_similarity_search_with_scores(
+                query, k=k, collection_name=self.collection_name
+            )
+            return [doc for doc, _ in results]
+
+    return PgvectorSearch()
+
+
+def build_pinecone(docs, embeddings):
+    import pinecone
+    from langchain.vectorstores import Pinecone
+
+    pinecone.init(
+        api_key=os.environ["PINECONE_API_KEY"], environment=os.environ["PINECONE_ENV"]
+    )
+    index_name = "benchmark-index"
+    if index_name in pinecone.list_indexes():
+        pinecone.delete_index(index_name)
+    pinecone.create_index(
+        name=index_name, metric="cosine", dimension=embeddings.dimensions
+    )
+    return Pinecone.from_documents(docs, embeddings, index_name=index_name)
+
+
+STORES = {
+    "faiss": build_faiss,
+    "local": build_local,
+    "pgvector": build_pgvector,
+    "pinecone": build_pinecone,
+}
+
+
+def available_stores():
+    stores = ["faiss", "local"]
+    if os.getenv("PGVECTOR_CONNECTION_STRING"):
+        stores.append("pgvector")
+    if os.getenv("PINECONE_API_KEY") and os.getenv("PINECONE_ENV"):
+        stores.append("pinecone")
+    return stores
+
+
+def benchmark_store(name, docs, queries, embeddings, k=4, concurrency=4, warmup=3):
+    start = time.perf_counter()
+    store = STORES[name](docs, embeddings)
+    build_time = time.perf_counter() - start
+
+    def search(query):
+        return store.similarity_search(query, k=k)
+
+    # Match results to the exact search by content, since stores assign their own ids
+    position = {doc.page_content: i for i, doc in enumerate(docs)}
+    retrieved = [
+        [position.get(doc.page_content) for doc in search(query)] for query in queries
+    ]
+    expected = exact_top_k(
+        embeddings.embed_documents(queries),
+        embeddings.embed_documents([doc.page_content for doc in docs]),
+        k,
+    )
+
+    return {
+        "build_time_s": build_time,
+        "latency": measure_latency(search, queries, warmup=warmup),
+        "throughput": measure_throughput(search, queries, concurrency=concurrency),
+        f"recall@{k}": recall_at_k(retrieved, expected.tolist()),
+    }
+
+
+# --------------------------------------------------------------
+# Command line
+# --------------------------------------------------------------
+
+
+def load_corpus(path, chunk_size=1000, num_queries=100):
+    """Splits a text file into documents and derives deterministic queries from them."""
+    from langchain.document_loaders import TextLoader
+    from langchain.text_splitter import CharacterTextSplitter
+
+    documents = TextLoader(path, encoding="utf-8").load()
+    text_splitter = CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=0)
+    docs = text_splitter.split_documents(documents)
+
+    # Use the first sentence of evenly spaced chunks as queries
+    step = max(1, len(docs) // num_queries)
+    queries = [
+        re.split(r"(?<=[.!?])\s", doc.page_content.strip())[0][:200]
+        for doc in docs[::step][:num_queries]
+    ]
+    return docs, queries
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", default=DEFAULT_DATA)
+    parser.add_argument("--stores", nargs="+", default=available_stores())
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    docs, queries = load_corpus(args.data, args.chunk_size, args.queries)
+    embeddings = HashingEmbeddings(args.dimensions)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "parameters": {**vars(args), "documents": len(docs)},
+        "results": {},
+    }
+    for name in args.stores:
+        print(f"Benchmarking {name}...")
+        report["results"][name] = benchmark_store(
+            name,
+            docs,
+            queries,
+            embeddings,
+            k=args.k,
+            concurrency=args.concurrency,
+            warmup=args.warmup,
+        )
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
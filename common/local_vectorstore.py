@@ -0,0 +1,364 @@
+import json
+import os
+import tempfile
+import uuid
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+DTYPES = ("float32", "float16", "int8")
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _quantize(vectors, dtype):
+    """Returns the vectors in the storage dtype, plus per-row scales for int8."""
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+        return quantized, scales
+    return vectors.astype(dtype), None
+
+
+def _top_k(scores, k):
+    """Returns the indices of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.array([], dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store for mid-sized collections, with the same similarity_search
+    surface as the FAISS and PGVector stores but no external service.
+
+    Vectors are L2-normalized, stored in append-only .npy segments (float32, or
+    quantized to float16/int8) and memory-mapped on load. Searches are exact cosine
+    similarity using a matrix product and argpartition per segment, or an HNSW index
+    when hnswlib is installed and build_hnsw_index has been called. Deleted ids are
+    tombstoned until compact rewrites the live rows into a single segment.
+
+    Scores are cosine similarities, so higher is better. Only one process should write
+    to a store directory at a time.
+    """
+
+    def __init__(self, embedding, path=".cache/local_vectorstore", dtype="float32"):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype: {dtype}, use one of {DTYPES}")
+
+        self.embedding = embedding
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        manifest_file = self.path / "manifest.json"
+        if manifest_file.exists():
+            self.manifest = json.loads(manifest_file.read_text())
+        else:
+            self.manifest = {"dtype": dtype, "segments": [], "next_segment": 0}
+        self.dtype = self.manifest["dtype"]
+
+        self.hnsw_index = None
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    # --------------------------------------------------------------
+    # Storage
+    # --------------------------------------------------------------
+
+    def _load_segment(self, name):
+        matrix = np.load(self.path / f"{name}.npy", mmap_mode="r")
+        scales_file = self.path / f"{name}.scales.npy"
+        scales = np.load(scales_file) if scales_file.exists() else None
+        self.segments.append((matrix, scales))
+
+        with open(self.path / f"{name}.jsonl", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self.id_to_position[record["id"]] = len(self.ids)
+                self.ids.append(record["id"])
+                self.docs.append(
+                    Document(
+                        page_content=record["page_content"],
+                        metadata=record["metadata"],
+                    )
+                )
+
+    def _load(self):
+        self.segments = []
+        self.ids = []
+        self.docs = []
+        self.id_to_position = {}
+        for name in self.manifest["segments"]:
+            self._load_segment(name)
+
+        tombstones_file = self.path / "tombstones.json"
+        self.tombstones = (
+            set(json.loads(tombstones_file.read_text()))
+            if tombstones_file.exists()
+            else set()
+        )
+        self._update_live_mask()
+
+        hnsw_file = self.path / "hnsw.bin"
+        if hnswlib is not None and hnsw_file.exists() and self.ids:
+            self.hnsw_index = hnswlib.Index(
+                space="ip", dim=self.segments[0][0].shape[1]
+            )
+            self.hnsw_index.load_index(str(hnsw_file), max_elements=len(self.ids))
+
+    def _update_live_mask(self):
+        # A row is live if its id is not deleted and no newer row has the same id
+        self.live_mask = np.array(
+            [
+                id not in self.tombstones and self.id_to_position[id] == i
+                for i, id in enumerate(self.ids)
+            ],
+            dtype=bool,
+        )
+
+    def _write_json(self, filename, data):
+        # Write to a temporary file first so readers never see a half-written file
+        tmp_file = self.path / f"{filename}.tmp"
+        tmp_file.write_text(json.dumps(data))
+        os.replace(tmp_file, self.path / filename)
+
+    def _write_segment(self, vectors, ids, docs):
+        name = f"seg-{self.manifest['next_segment']:06d}"
+        self.manifest["next_segment"] += 1
+
+        matrix, scales = _quantize(vectors, self.dtype)
+        np.save(self.path / f"{name}.npy", matrix)
+        if scales is not None:
+            np.save(self.path / f"{name}.scales.npy", scales)
+
+        with open(self.path / f"{name}.jsonl", "w", encoding="utf-8") as f:
+            for id, doc in zip(ids, docs):
+                record = {
+                    "id": id,
+                    "page_content": doc.page_content,
+                    "metadata": doc.metadata,
+                }
+                f.write(json.dumps(record) + "\n")
+        return name
+
+    def _invalidate_hnsw_index(self):
+        self.hnsw_index = None
+        (self.path / "hnsw.bin").unlink(missing_ok=True)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+
+        vectors = _normalize(self.embedding.embed_documents(texts))
+        docs = [
+            Document(page_content=text, metadata=metadata)
+            for text, metadata in zip(texts, metadatas)
+        ]
+        name = self._write_segment(vectors, ids, docs)
+        self.manifest["segments"].append(name)
+        self._write_json("manifest.json", self.manifest)
+
+        # Re-adding an id replaces the old row, since the newest row of an id is the live one
+        if self.tombstones.intersection(ids):
+            self.tombstones.difference_update(ids)
+            self._write_json("tombstones.json", sorted(self.tombstones))
+
+        self._load_segment(name)
+        self._update_live_mask()
+        self._invalidate_hnsw_index()
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return False
+        self.tombstones.update(ids)
+        self._write_json("tombstones.json", sorted(self.tombstones))
+        self._update_live_mask()
+        return True
+
+    def compact(self):
+        """Rewrites all live rows into a single segment and removes the old segments."""
+        live = np.flatnonzero(self.live_mask)
+
+        old_segments = list(self.manifest["segments"])
+        new_segments = []
+        if len(live):
+            vectors = self._all_vectors()
+            name = self._write_segment(
+                vectors[live],
+                [self.ids[i] for i in live],
+                [self.docs[i] for i in live],
+            )
+            new_segments.append(name)
+
+        self.manifest["segments"] = new_segments
+        self._write_json("manifest.json", self.manifest)
+        self.tombstones = set()
+        self._write_json("tombstones.json", [])
+        for name in old_segments:
+            for suffix in (".npy", ".scales.npy", ".jsonl"):
+                (self.path / f"{name}{suffix}").unlink(missing_ok=True)
+
+        self._invalidate_hnsw_index()
+        self._load()
+
+    def _all_vectors(self):
+        """Returns all rows as one float32 matrix."""
+        segments = []
+        for matrix, scales in self.segments:
+            vectors = np.asarray(matrix, dtype=np.float32)
+            if scales is not None:
+                vectors = vectors * scales[:, None]
+            segments.append(vectors)
+        return np.concatenate(segments)
+
+    # --------------------------------------------------------------
+    # Search
+    # --------------------------------------------------------------
+
+    def build_hnsw_index(self, m=16, ef_construction=200, ef_search=64):
+        """Builds and saves an HNSW index over all rows. Requires hnswlib."""
+        if hnswlib is None:
+            raise ImportError(
+                "hnswlib is required for HNSW search: pip install hnswlib"
+            )
+        if not self.ids:
+            return
+
+        vectors = self._all_vectors()
+        index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        index.init_index(
+            max_elements=len(vectors), M=m, ef_construction=ef_construction
+        )
+        index.add_items(vectors, np.arange(len(vectors)))
+        index.set_ef(ef_search)
+        index.save_index(str(self.path / "hnsw.bin"))
+        self.hnsw_index = index
+
+    def _filter_mask(self, filter):
+        return np.array(
+            [
+                all(doc.metadata.get(key) == value for key, value in filter.items())
+                for doc in self.docs
+            ],
+            dtype=bool,
+        )
+
+    def _exact_search(self, query, k, filter=None, chunk_size=65536):
+        """
+        Scores the rows chunk by chunk with a matrix product, so only one chunk of a
+        memory-mapped segment is converted to float32 at a time, and merges the top k.
+        """
+        mask = self.live_mask
+        if filter:
+            mask = mask & self._filter_mask(filter)
+
+        positions, scores = [], []
+        offset = 0
+        for matrix, scales in self.segments:
+            for start in range(0, len(matrix), chunk_size):
+                chunk = np.asarray(matrix[start : start + chunk_size], dtype=np.float32)
+                chunk_scores = chunk @ query
+                if scales is not None:
+                    chunk_scores *= scales[start : start + chunk_size]
+
+                chunk_offset = offset + start
+                chunk_scores[~mask[chunk_offset : chunk_offset + len(chunk)]] = -np.inf
+                top = _top_k(chunk_scores, k)
+                positions.extend(chunk_offset + top)
+                scores.extend(chunk_scores[top])
+            offset += len(matrix)
+
+        positions, scores = np.array(positions, dtype=np.int64), np.array(scores)
+        order = _top_k(scores, k)
+        return [
+            (int(positions[i]), float(scores[i]))
+            for i in order
+            if np.isfinite(scores[i])
+        ]
+
+    def _hnsw_search(self, query, k):
+        # Ask for extra neighbours so that deleted and replaced rows can be skipped
+        num_dead = len(self.live_mask) - int(self.live_mask.sum())
+        num_neighbours = min(len(self.ids), k + num_dead)
+        labels, distances = self.hnsw_index.knn_query(query, k=num_neighbours)
+        results = [
+            (int(position), 1.0 - float(distance))
+            for position, distance in zip(labels[0], distances[0])
+            if self.live_mask[position]
+        ]
+        return results[:k]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None):
+        if not self.ids:
+            return []
+        query = _normalize(embedding)
+        if self.hnsw_index is not None and not filter:
+            results = self._hnsw_search(query, k)
+        else:
+            results = self._exact_search(query, k, filter)
+        return [(self.docs[position], score) for position, score in results]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        embedding = self.embedding.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k, filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        results = self.similarity_search_with_score_by_vector(embedding, k, filter)
+        return [doc for doc, _ in results]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        results = self.similarity_search_with_score(query, k, filter)
+        return [doc for doc, _ in results]
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities
+        return lambda score: score
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts,
+        embedding,
+        metadatas=None,
+        ids=None,
+        path=None,
+        dtype="float32",
+        append=False,
+        **kwargs,
+    ):
+        """
+        Build a new store from texts, like FAISS.from_texts. Without a path the store
+        is written to a new temporary directory. A path that already holds a store is
+        rejected, unless append is True to add the texts to it.
+        """
+        if path is None:
+            path = tempfile.mkdtemp(prefix="local_vectorstore-")
+        elif not append and Path(path).is_dir() and any(Path(path).iterdir()):
+            raise ValueError(
+                f"{path} already holds a store, pass append=True to add to it"
+            )
+        store = cls(embedding, path=path, dtype=dtype)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
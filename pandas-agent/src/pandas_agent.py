@@ -9,6 +9,7 @@ from langchain.agents import AgentType, initialize_agent, load_tools
 
 import pandas as pd
 
+from query_router import QueryRouter
 
 # --------------------------------------------------------------
 # Load the OpenAI and Google Serp API tokens from the .env file
@@ -49,37 +50,46 @@ df = pd.read_excel("../data/ds_salaries.xlsx")
 llm = ChatOpenAI(temperature=0, model="gpt-4-1106-preview")
 agent = create_pandas_dataframe_agent(llm, df, verbose=True)
 
+# Schema questions are answered from a profile of the dataframe, the rest go to the agent
+router = QueryRouter(df, agent)
+
 
 # --------------------------------------------------------------
 # Perform basic data exploration
 # --------------------------------------------------------------
 
-agent.run("how many rows and columns are there in the dataset?")
+print(router.run("how many rows and columns are there in the dataset?"))
 
-agent.run("are there any missing values?")
+print(router.run("are there any missing values?"))
 
-agent.run("what are the columns?")
+print(router.run("what are the columns?"))
 
-agent.run("how many categories are in each column?")
+print(router.run("how many categories are in each column?"))
 
 
 # --------------------------------------------------------------
 # Perform multiple-steps data exploration
 # --------------------------------------------------------------
 
-agent.run("which are the top 5 jobs that have the highest median salary?")
+print(router.run("which are the top 5 jobs that have the highest median salary?"))
 
-agent.run("what is the percentage of data scientists who are working full time?")
+print(
+    router.run("what is the percentage of data scientists who are working full time?")
+)
 
-agent.run("which company location has the most employees working remotely?")
+print(router.run("which company location has the most employees working remotely?"))
 
-agent.run("what is the most frequent job position for senior-level employees?")
+print(router.run("what is the most frequent job position for senior-level employees?"))
 
-agent.run(
-    "what are the categories of company size? What is the proportion of employees they have? What is the total salary they pay for their employees?"
+print(
+    router.run(
+        "what are the categories of company size? What is the proportion of employees they have? What is the total salary they pay for their employees?"
+    )
 )
-agent.run(
-    "get median salaries of senior-level data scientists for each company size and plot them in a bar plot."
+print(
+    router.run(
+        "get median salaries of senior-level data scientists for each company size and plot them in a bar plot."
+    )
 )
 
 # --------------------------------------------------------------
@@ -90,19 +100,26 @@ df_2022 = df[df["work_year"] == 2022]
 df_2023 = df[df["work_year"] == 2023]
 
 agent = create_pandas_dataframe_agent(llm, [df_2022, df_2023], verbose=True)
+router = QueryRouter([df_2022, df_2023], agent)
 
 # --------------------------------------------------------------
 # Perform basic & multiple-steps data exploration for both dataframes
 # --------------------------------------------------------------
 
-agent.run("how many rows and columns are there for each dataframe?")
+print(router.run("how many rows and columns are there for each dataframe?"))
 
-agent.run(
-    "what are the differences in median salary for data scientists among the dataframes?"
+print(
+    router.run(
+        "what are the differences in median salary for data scientists among the dataframes?"
+    )
 )
-agent.run(
-    "how many people were hired for each of the dataframe? what are the percentages of experience levels?"
+print(
+    router.run(
+        "how many people were hired for each of the dataframe? what are the percentages of experience levels?"
+    )
 )
-agent.run(
-    "what is the median salary of senior data scientists for df2, given there is a 10% increment?"
+print(
+    router.run(
+        "what is the median salary of senior data scientists for df2, given there is a 10% increment?"
+    )
 )
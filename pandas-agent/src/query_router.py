@@ -0,0 +1,167 @@
+import re
+
+import pandas as pd
+
+# Optional endings like "in the dataset" or "for each dataframe"
+DATASET = (
+    r"(?: (?:are )?(?:there )?(?:in|of|for) (?:the|this|each|each of the) "
+    r"(?:dataset|dataframe|data|table|df)s?)?"
+)
+
+PATTERNS = {
+    "shape": [
+        r"(?:how many|what is the number of|what are the number of) "
+        r"(?:rows and columns|columns and rows|rows|columns)(?: are there)?" + DATASET,
+        r"what (?:is|are) the (?:shape|size|dimensions?)" + DATASET,
+    ],
+    "missing": [
+        r"(?:are|is) there any (?:missing|null|nan|na) values?" + DATASET,
+        r"(?:does|do) (?:the|this) (?:dataset|dataframe|data) (?:have|contain) any "
+        r"(?:missing|null|nan|na) values?",
+        r"how many (?:missing|null|nan|na) values (?:are there|does it have)" + DATASET,
+        r"which columns (?:have|contain) (?:missing|null|nan|na) values" + DATASET,
+    ],
+    "columns": [
+        r"what are the (?:columns|column names)" + DATASET,
+        r"what columns are there" + DATASET,
+        r"(?:list|show)(?: me)? (?:the|all) columns" + DATASET,
+    ],
+    "dtypes": [
+        r"what are the (?:data ?types|dtypes|column types|types of the columns)"
+        + DATASET,
+    ],
+    "cardinality": [
+        r"how many (?:categories|unique values|distinct values) are (?:there )?"
+        r"in each column" + DATASET,
+    ],
+    "describe": [
+        r"(?:describe|summarize) the (?:dataset|dataframe|data)",
+        r"what are the (?:summary|descriptive) statistics" + DATASET,
+    ],
+}
+
+STATISTICS = {
+    "mean": "mean",
+    "average": "mean",
+    "median": "50%",
+    "minimum": "min",
+    "min": "min",
+    "maximum": "max",
+    "max": "max",
+    "standard deviation": "std",
+}
+STATISTIC_PATTERN = (
+    r"what is the (" + "|".join(STATISTICS) + r")(?: of the| of)? (.+?)" + DATASET
+)
+
+
+def normalize_question(question):
+    question = question.lower().strip().rstrip("?.! ")
+    return " ".join(question.split())
+
+
+class DataFrameProfile:
+    """
+    Shape, dtypes, null counts, cardinalities and numeric quantiles of a dataframe,
+    computed once so schema questions can be answered without going through the data.
+    """
+
+    def __init__(self, df):
+        self.rows, self.columns = df.shape
+        self.column_names = list(df.columns)
+        self.dtypes = df.dtypes.astype(str).to_dict()
+        self.null_counts = df.isna().sum().to_dict()
+        self.cardinalities = df.nunique().to_dict()
+        numeric = df.select_dtypes("number")
+        self.statistics = (
+            numeric.describe(percentiles=[0.25, 0.5, 0.75]).to_dict()
+            if not numeric.empty
+            else {}
+        )
+
+    def find_numeric_column(self, name):
+        """Match a column name as written in a question, e.g. "salary in usd"."""
+        name = name.replace("_", " ")
+        for column in self.statistics:
+            if str(column).lower().replace("_", " ") == name:
+                return column
+        return None
+
+    def answer(self, kind):
+        if kind == "shape":
+            return f"The dataset has {self.rows} rows and {self.columns} columns."
+        if kind == "missing":
+            missing = {column: n for column, n in self.null_counts.items() if n}
+            if not missing:
+                return "There are no missing values in the dataset."
+            counts = ", ".join(f"{column}: {n}" for column, n in missing.items())
+            return (
+                f"Yes, there are missing values. Missing values per column: {counts}."
+            )
+        if kind == "columns":
+            return "The columns are: " + ", ".join(map(str, self.column_names)) + "."
+        if kind == "dtypes":
+            types = ", ".join(
+                f"{column}: {dtype}" for column, dtype in self.dtypes.items()
+            )
+            return f"The data types are: {types}."
+        if kind == "cardinality":
+            counts = ", ".join(
+                f"{column}: {n}" for column, n in self.cardinalities.items()
+            )
+            return f"The number of unique values in each column is: {counts}."
+        if kind == "describe":
+            return str(pd.DataFrame(self.statistics).round(2))
+        raise ValueError(f"Unknown question kind: {kind}")
+
+
+class QueryRouter:
+    """
+    Answers common schema and profile questions directly from a DataFrameProfile,
+    and passes every other question on to the pandas dataframe agent.
+    Takes a dataframe or a list of dataframes, like create_pandas_dataframe_agent.
+    """
+
+    def __init__(self, df, agent):
+        dfs = df if isinstance(df, list) else [df]
+        self.profiles = [DataFrameProfile(df) for df in dfs]
+        self.agent = agent
+
+    def answer(self, question):
+        """
+        Returns:
+            str: The answer, or None if the question needs the agent.
+        """
+        question = normalize_question(question)
+        answers = None
+        for kind, patterns in PATTERNS.items():
+            if any(re.fullmatch(pattern, question) for pattern in patterns):
+                answers = [profile.answer(kind) for profile in self.profiles]
+                break
+        else:
+            match = re.fullmatch(STATISTIC_PATTERN, question)
+            if match:
+                statistic, name = STATISTICS[match.group(1)], match.group(2)
+                columns = [
+                    profile.find_numeric_column(name) for profile in self.profiles
+                ]
+                if None in columns:
+                    return None
+                answers = [
+                    f"The {match.group(1)} of {column} is "
+                    f"{profile.statistics[column][statistic]:,.2f}."
+                    for profile, column in zip(self.profiles, columns)
+                ]
+
+        if answers is None:
+            return None
+        if len(answers) == 1:
+            return answers[0]
+        # Name the dataframes the way the agent does
+        return "\n".join(f"df{i + 1}: {answer}" for i, answer in enumerate(answers))
+
+    def run(self, question):
+        answer = self.answer(question)
+        if answer is None:
+            return self.agent.run(question)
+        return answer
@@ -0,0 +1,264 @@
+from langchain.embeddings.openai import OpenAIEmbeddings
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from dotenv import load_dotenv
+import asyncio
+import logging
+import random
+
+from pgvector_service import (
+    CollectionStore,
+    EmbeddingStore,
+    RowCountCache,
+    _is_rate_limit_error,
+    batch_documents,
+    build_search_many_params,
+    build_search_many_query,
+    fingerprint_document,
+    group_search_many_results,
+)
+from common.embedding_cache import CachedEmbeddings
+
+
+class AsyncPgvectorService:
+    """
+    Async variant of PgvectorService for web and Slack workers that serve many
+    concurrent retrieval requests. Uses a pooled asyncpg engine with a prepared
+    statement cache, so no connection or PGVector object is created per call.
+    """
+
+    def __init__(
+        self,
+        connection_string,
+        pool_size=10,
+        max_overflow=20,
+        prepared_statement_cache_size=500,
+        embedding_dimensions=1536,
+        exact_search_threshold=10000,
+        max_concurrent_embeddings=4,
+        embeddings=None,
+        row_count_ttl=60,
+    ):
+        load_dotenv()
+        self.embeddings = embeddings or CachedEmbeddings(OpenAIEmbeddings())
+        url = make_url(connection_string).set(drivername="postgresql+asyncpg")
+        url = url.update_query_dict(
+            {"prepared_statement_cache_size": str(prepared_statement_cache_size)}
+        )
+        self.engine = create_async_engine(
+            url,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_pre_ping=True,
+            pool_recycle=1800,
+        )
+        self.EmbeddingStore = EmbeddingStore
+        self.embedding_dimensions = embedding_dimensions
+        self.exact_search_threshold = exact_search_threshold
+        self.max_concurrent_embeddings = max_concurrent_embeddings
+        self.row_counts = RowCountCache(
+            self.EmbeddingStore.__tablename__, row_count_ttl
+        )
+        self._collection_ids = {}
+
+    async def close(self) -> None:
+        await self.engine.dispose()
+
+    async def get_collection_id(self, connection, collection_name):
+        if collection_name not in self._collection_ids:
+            result = await connection.execute(
+                select(CollectionStore.uuid).where(
+                    CollectionStore.name == collection_name
+                )
+            )
+            collection_id = result.scalar()
+            if collection_id is None:
+                return None
+            self._collection_ids[collection_name] = collection_id
+        return self._collection_ids[collection_name]
+
+    async def _configure_search(
+        self,
+        connection,
+        exact=None,
+        ef_search=None,
+        probes=None,
+        collection_id=None,
+        filter=None,
+    ):
+        """Sets the index search parameters for the current transaction, see PgvectorService."""
+        if exact is None:
+            row_count = self.row_counts.get(collection_id, filter)
+            if row_count is None:
+                statement, params = self.row_counts.query(collection_id, filter)
+                result = await connection.execute(statement, params)
+                row_count = self.row_counts.put(collection_id, filter, result.scalar())
+            exact = 0 <= row_count < self.exact_search_threshold
+
+        if exact:
+            await connection.execute(text("SET LOCAL enable_indexscan = off"))
+            return
+        if ef_search is not None:
+            await connection.execute(
+                text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+            )
+        if probes is not None:
+            await connection.execute(
+                text(f"SET LOCAL ivfflat.probes = {int(probes)}")
+            )
+
+    async def search_many(
+        self,
+        queries,
+        k=3,
+        collection_name=None,
+        filter=None,
+        ef_search=None,
+        probes=None,
+        exact=None,
+    ):
+        """Returns one list of (document, score) tuples per query, see PgvectorService.search_many."""
+        queries = list(queries)
+        if not queries:
+            return []
+
+        vectors = await self.embeddings.aembed_documents(queries)
+
+        async with self.engine.connect() as connection:
+            async with connection.begin():
+                collection_id = None
+                if collection_name is not None:
+                    collection_id = await self.get_collection_id(
+                        connection, collection_name
+                    )
+                    if collection_id is None:
+                        raise ValueError(
+                            f"Collection does not exist: {collection_name}"
+                        )
+
+                await self._configure_search(
+                    connection, exact, ef_search, probes, collection_id, filter
+                )
+                statement = build_search_many_query(
+                    self.EmbeddingStore.__tablename__,
+                    self.embedding_dimensions,
+                    len(queries),
+                    with_collection=collection_id is not None,
+                    with_filter=bool(filter),
+                )
+                params = build_search_many_params(vectors, k, collection_id, filter)
+                rows = (await connection.execute(statement, params)).all()
+
+        return group_search_many_results(rows, len(queries))
+
+    async def search(self, query, k=3, **kwargs):
+        """Returns a list of (document, score) tuples for a single query."""
+        results = await self.search_many([query], k=k, **kwargs)
+        return results[0]
+
+    async def _embed_batch(self, semaphore, batch, max_retries=6):
+        texts = [doc.page_content for _, doc in batch]
+        async with semaphore:
+            for attempt in range(max_retries):
+                try:
+                    return batch, await self.embeddings.aembed_documents(texts)
+                except Exception as e:
+                    if not _is_rate_limit_error(e) or attempt == max_retries - 1:
+                        raise
+                    delay = min(60, 2**attempt) + random.uniform(0, 1)
+                    logging.warning(f"Rate limited, retrying in {delay:.1f} seconds")
+                    await asyncio.sleep(delay)
+
+    async def upsert(self, docs, collection_name) -> int:
+        """
+        Adds documents to a collection, creating it if needed. Documents are stored with
+        their content hash as custom_id, so documents that are already stored are skipped.
+        If a batch fails, the other batches are cancelled and the inserted ones removed.
+        Returns the number of inserted documents.
+        """
+        fingerprints = {}
+        for doc in docs:
+            fingerprints.setdefault(fingerprint_document(doc), doc)
+
+        async with self.engine.begin() as connection:
+            collection_id = await self.get_collection_id(connection, collection_name)
+            if collection_id is None:
+                result = await connection.execute(
+                    insert(CollectionStore)
+                    .values(name=collection_name)
+                    .returning(CollectionStore.uuid)
+                )
+                collection_id = result.scalar()
+                self._collection_ids[collection_name] = collection_id
+
+            result = await connection.execute(
+                select(self.EmbeddingStore.custom_id).where(
+                    self.EmbeddingStore.collection_id == collection_id
+                )
+            )
+            stored_ids = set(result.scalars())
+
+        new_ids = [id for id in fingerprints if id not in stored_ids]
+        semaphore = asyncio.Semaphore(self.max_concurrent_embeddings)
+        tasks = [
+            asyncio.ensure_future(self._embed_batch(semaphore, batch))
+            for batch in batch_documents(
+                [fingerprints[id] for id in new_ids], ids=new_ids
+            )
+        ]
+
+        inserted_ids = []
+        try:
+            for task in asyncio.as_completed(tasks):
+                batch, vectors = await task
+                rows = [
+                    {
+                        "collection_id": collection_id,
+                        "embedding": vector,
+                        "document": doc.page_content,
+                        "cmetadata": doc.metadata,
+                        "custom_id": custom_id,
+                    }
+                    for (custom_id, doc), vector in zip(batch, vectors)
+                ]
+                async with self.engine.begin() as connection:
+                    await connection.execute(insert(self.EmbeddingStore), rows)
+                inserted_ids.extend(row["custom_id"] for row in rows)
+        except BaseException:
+            # Stop the other batches and remove what was inserted, like PgvectorService
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._delete_ids(collection_id, inserted_ids)
+            raise
+
+        logging.info(f"Inserted {len(inserted_ids)} documents into {collection_name}")
+        return len(inserted_ids)
+
+    async def _delete_ids(self, collection_id, custom_ids) -> None:
+        async with self.engine.begin() as connection:
+            for i in range(0, len(custom_ids), 1000):
+                await connection.execute(
+                    delete(self.EmbeddingStore).where(
+                        self.EmbeddingStore.collection_id == collection_id,
+                        self.EmbeddingStore.custom_id.in_(custom_ids[i : i + 1000]),
+                    )
+                )
+
+    async def delete(self, collection_name) -> None:
+        """Deletes a collection and its embeddings."""
+        logging.info(f"Deleting collection: {collection_name}")
+        self._collection_ids.pop(collection_name, None)
+        async with self.engine.begin() as connection:
+            collection_id = await self.get_collection_id(connection, collection_name)
+            if collection_id is None:
+                return
+            await connection.execute(
+                delete(self.EmbeddingStore).where(
+                    self.EmbeddingStore.collection_id == collection_id
+                )
+            )
+            await connection.execute(
+                delete(CollectionStore).where(CollectionStore.uuid == collection_id)
+            )
@@ -1,3 +1,9 @@
+import os
+import sys
+
+# Put the repository root on the path for the shared helpers in common/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 import pinecone
 from dotenv import load_dotenv
 from langchain.document_loaders import TextLoader
@@ -7,8 +13,10 @@ from langchain.vectorstores import Pinecone
 from langchain.document_loaders import TextLoader
 from langchain.vectorstores.pgvector import PGVector
 from pgvector_service import PgvectorService
-import os
-import time
+from async_pgvector_service import AsyncPgvectorService
+from common.benchmark import measure_latency
+from common.embedding_cache import CachedEmbeddings
+import asyncio
 
 load_dotenv()
 
@@ -24,7 +32,7 @@ documents = loader.load()
 text_splitter = CharacterTextSplitter(chunk_size=2000, chunk_overlap=0)
 docs = text_splitter.split_documents(documents)
 
-embeddings = OpenAIEmbeddings()
+embeddings = CachedEmbeddings(OpenAIEmbeddings())
 
 query = "The Project Gutenberg eBook of A Christmas Carol in Prose; Being a Ghost Story of Christmas"
 
@@ -63,26 +71,22 @@ def run_query_pinecone(docsearch, query):
     return result
 
 
-def calculate_average_execution_time(func, *args, **kwargs):
-    total_execution_time = 0
-    num_runs = 10
-    for _ in range(num_runs):
-        start_time = time.time()
-        result = func(*args, **kwargs)  # Execute the function with its arguments
-        end_time = time.time()
-        execution_time = end_time - start_time
-        total_execution_time += execution_time
-    average_execution_time = round(total_execution_time / num_runs, 2)
+def calculate_execution_time(func, *args, runs=10, **kwargs):
+    """
+    Runs the function several times and prints the p50/p95/p99 latency.
+    See common/benchmark.py for the full offline benchmark of the vector stores.
+    """
+    result = func(*args, **kwargs)
     print(result)
+    stats = measure_latency(lambda _: func(*args, **kwargs), range(runs), warmup=1)
     print(
-        f"\nThe function took an average of {average_execution_time} seconds to execute."
+        f"\nThe function took {stats['p50_ms']:.0f} ms (p50), {stats['p95_ms']:.0f} ms (p95) "
+        f"and {stats['p99_ms']:.0f} ms (p99) to execute."
     )
-    return
+    return stats
 
 
-calculate_average_execution_time(
-    run_query_pinecone, docsearch=pinecone_docsearch, query=query
-)
+calculate_execution_time(run_query_pinecone, docsearch=pinecone_docsearch, query=query)
 
 
 """
@@ -143,9 +147,7 @@ def run_query_pgvector(docsearch, query):
     return result
 
 
-calculate_average_execution_time(
-    run_query_pgvector, docsearch=pgvector_docsearch, query=query
-)
+calculate_execution_time(run_query_pgvector, docsearch=pgvector_docsearch, query=query)
 
 
 # --------------------------------------------------------------
@@ -184,6 +186,59 @@ def run_query_multi_pgvector(docsearch, query):
 
 run_query_multi_pgvector(pg, query)
 
+# Only search within one collection instead of ranking rows from every collection
+pg.create_metadata_indexes()
+results = pg.custom_similarity_search_with_scores(
+    query, k=4, collection_name=COLLECTION_NAME
+)
+print(results[0][0].metadata)
+
+# Run several queries with one embedding call and one SQL round trip
+results = pg.search_many(
+    [query, "Who is Ebenezer Scrooge?", "What happens on Christmas Eve?"],
+    k=4,
+    collection_name=COLLECTION_NAME,
+)
+for query_results in results:
+    print(query_results[0][0].page_content[:100])
+
+
+# --------------------------------------------------------------
+# Serve concurrent queries with the async service
+# --------------------------------------------------------------
+
+
+async def run_concurrent_queries(queries):
+    async_pg = AsyncPgvectorService(CONNECTION_STRING, pool_size=10)
+    try:
+        return await asyncio.gather(
+            *(
+                async_pg.search(q, k=4, collection_name=COLLECTION_NAME)
+                for q in queries
+            )
+        )
+    finally:
+        await async_pg.close()
+
+
+results = asyncio.run(
+    run_concurrent_queries([query, "Who is Ebenezer Scrooge?", "Who is Tiny Tim?"])
+)
+print(f"Embedding cache: {embeddings.stats()}")
+
+# --------------------------------------------------------------
+# Add an approximate nearest neighbour index
+# --------------------------------------------------------------
+
+pg.create_index(method="hnsw")
+pg.create_index(collection_name=COLLECTION_NAME, method="hnsw")
+print(pg.get_index_stats())
+
+# Higher ef_search gives better recall at the cost of latency
+results = pg.custom_similarity_search_with_scores(
+    query, k=4, collection_name=COLLECTION_NAME, ef_search=100
+)
+
 # --------------------------------------------------------------
 # Delete the collection
 # --------------------------------------------------------------
@@ -194,3 +249,11 @@ pg.delete_collection(COLLECTION_NAME_2)
 # Update the collection
 # --------------------------------------------------------------
 pg.update_collection(docs=docs, collection_name=COLLECTION_NAME)
+
+# Incremental updates store each chunk under its content hash. The first one rewrites
+# all chunks of the full update above, which have random IDs
+pg.update_collection(docs=docs, collection_name=COLLECTION_NAME, incremental=True)
+
+# After that only the chunks that changed are embedded and written
+docs[0].page_content += " (edited)"
+print(pg.sync_pgvector_collection(docs, COLLECTION_NAME))  # 1 inserted, 1 deleted
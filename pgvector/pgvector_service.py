@@ -4,68 +4,613 @@ from langchain_community.vectorstores.pgvector import (
     _get_embedding_collection_store,
 )
 from langchain_core.documents import Document
-from sqlalchemy import create_engine, text
+from pgvector.sqlalchemy import Vector
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import cast, create_engine, insert, text
 from sqlalchemy.orm import Session
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dotenv import load_dotenv
+import hashlib
+import itertools
+import json
 import logging
+import random
+import time
+import uuid
 
+import tiktoken
 
-EmbeddingStore = _get_embedding_collection_store()[0]
+# The entry script puts the repository root on the path, see pgvector_quickstart.py
+from common.embedding_cache import CachedEmbeddings
+
+
+EmbeddingStore, CollectionStore = _get_embedding_collection_store()
+
+
+def batch_documents(docs, ids=None, max_tokens=20000, max_batch_size=500):
+    """
+    Groups documents into batches for the embeddings API, each holding at most
+    max_tokens tokens and max_batch_size documents. Accepts any iterable, so the
+    documents never have to be in memory all at once.
+
+    Yields lists of (custom_id, document) tuples. A random custom_id is generated
+    for each document when no ids are given.
+    """
+    encoding = tiktoken.get_encoding("cl100k_base")
+    if ids is None:
+        ids = (str(uuid.uuid4()) for _ in itertools.count())
+
+    batch, batch_tokens = [], 0
+    for custom_id, doc in zip(ids, docs):
+        num_tokens = len(encoding.encode(doc.page_content, disallowed_special=()))
+        if batch and (
+            batch_tokens + num_tokens > max_tokens or len(batch) >= max_batch_size
+        ):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append((custom_id, doc))
+        batch_tokens += num_tokens
+    if batch:
+        yield batch
+
+
+def fingerprint_document(doc):
+    """Returns a SHA-256 hash of the document content and metadata, used as its custom_id."""
+    payload = json.dumps(
+        {"page_content": doc.page_content, "metadata": doc.metadata},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def build_search_many_query(
+    table, dimensions, num_queries, with_collection=False, with_filter=False
+):
+    """
+    Builds one SQL statement that runs a top-k search for each query vector, using a
+    LATERAL join over a VALUES list of (idx, embedding) rows. Takes the parameters
+    returned by build_search_many_params.
+    """
+    values = ", ".join(
+        f"({i}, CAST(:q{i} AS vector({dimensions})))" for i in range(num_queries)
+    )
+    conditions = []
+    if with_collection:
+        conditions.append("collection_id = CAST(:collection_id AS uuid)")
+    if with_filter:
+        conditions.append("cmetadata::jsonb @> CAST(:filter AS jsonb)")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    return text(
+        f"""
+        SELECT q.idx, e.document, e.custom_id, e.cmetadata, e.distance
+        FROM (VALUES {values}) AS q(idx, embedding)
+        CROSS JOIN LATERAL (
+            SELECT document, custom_id, cmetadata,
+                   embedding::vector({dimensions}) <=> q.embedding AS distance
+            FROM {table}
+            {where}
+            ORDER BY distance
+            LIMIT :k
+        ) AS e
+        ORDER BY q.idx, e.distance
+        """
+    )
+
+
+def build_search_many_params(vectors, k, collection_id=None, filter=None):
+    params = {
+        f"q{i}": "[" + ",".join(map(str, vector)) + "]"
+        for i, vector in enumerate(vectors)
+    }
+    params["k"] = k
+    if collection_id is not None:
+        params["collection_id"] = str(collection_id)
+    if filter:
+        params["filter"] = json.dumps(filter)
+    return params
+
+
+def group_search_many_results(rows, num_queries):
+    """Turns (idx, document, custom_id, metadata, distance) rows into one result list per query."""
+    results = [[] for _ in range(num_queries)]
+    for idx, document, custom_id, metadata, distance in rows:
+        doc = Document(
+            page_content=document,
+            metadata={**(metadata or {}), "custom_id": custom_id},
+        )
+        results[idx].append((doc, 1 - distance))
+    return results
+
+
+class RowCountCache:
+    """
+    Number of rows a search has to rank, used to choose between an exact scan and an
+    index search. Rows in a collection, or matching a filter, are counted with the
+    metadata indexes; an unrestricted search uses the planner's estimate for the
+    table. Counts are cached for ttl seconds per collection and filter.
+    """
+
+    def __init__(self, table, ttl=60):
+        self.table = table
+        self.ttl = ttl
+        self.counts = {}
+
+    def key(self, collection_id=None, filter=None):
+        return (
+            None if collection_id is None else str(collection_id),
+            json.dumps(filter, sort_keys=True) if filter else None,
+        )
+
+    def get(self, collection_id=None, filter=None):
+        """Returns the cached count, or None if it is not cached or has expired."""
+        count, expires_at = self.counts.get(
+            self.key(collection_id, filter), (None, 0.0)
+        )
+        return count if time.monotonic() < expires_at else None
+
+    def put(self, collection_id, filter, count) -> int:
+        count = -1 if count is None else count
+        self.counts[self.key(collection_id, filter)] = (
+            count,
+            time.monotonic() + self.ttl,
+        )
+        return count
+
+    def query(self, collection_id=None, filter=None):
+        """Returns the statement and parameters that count the rows, -1 if unknown."""
+        if collection_id is None and not filter:
+            statement = text(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"
+            )
+            return statement, {"table": self.table}
+
+        conditions, params = [], {}
+        if collection_id is not None:
+            conditions.append("collection_id = CAST(:collection_id AS uuid)")
+            params["collection_id"] = str(collection_id)
+        if filter:
+            conditions.append("cmetadata::jsonb @> CAST(:filter AS jsonb)")
+            params["filter"] = json.dumps(filter)
+        statement = text(
+            f"SELECT count(*) FROM {self.table} WHERE {' AND '.join(conditions)}"
+        )
+        return statement, params
+
+
+def _is_rate_limit_error(error):
+    return (
+        getattr(error, "status_code", None) == 429
+        or "RateLimit" in type(error).__name__
+    )
 
 
 class PgvectorService:
-    def __init__(self, connection_string):
+    def __init__(
+        self,
+        connection_string,
+        embedding_dimensions=1536,
+        exact_search_threshold=10000,
+        embeddings=None,
+        row_count_ttl=60,
+    ):
         load_dotenv()
-        self.embeddings = OpenAIEmbeddings()
+        self.embeddings = embeddings or CachedEmbeddings(OpenAIEmbeddings())
         self.cnx = connection_string
         self.collections = []
         self.engine = create_engine(self.cnx)
         self.EmbeddingStore = EmbeddingStore
+        # The embedding column has no fixed size, so vector indexes are built on a cast
+        # to the model's dimensions and searches have to use the same expression
+        self.embedding_dimensions = embedding_dimensions
+        # Below this number of rows an exact scan is cheaper than an index lookup
+        self.exact_search_threshold = exact_search_threshold
+        # The row counts that pick exact search are cached for row_count_ttl seconds
+        self.row_counts = RowCountCache(
+            self.EmbeddingStore.__tablename__, row_count_ttl
+        )
+        # Collection IDs by name, so searches don't look them up on every query
+        self._collection_ids = {}
 
     def get_vector(self, text):
         return self.embeddings.embed_query(text)
 
-    def custom_similarity_search_with_scores(self, query, k=3):
+    def embedding_cache_stats(self):
+        """Returns the hits, misses and hit rate of the embedding cache."""
+        return self.embeddings.stats()
+
+    def _embedding_column(self):
+        return cast(self.EmbeddingStore.embedding, Vector(self.embedding_dimensions))
+
+    def _count_rows(self, session, collection_id=None, filter=None) -> int:
+        """Returns the number of rows a search ranks, or -1 if unknown."""
+        count = self.row_counts.get(collection_id, filter)
+        if count is None:
+            statement, params = self.row_counts.query(collection_id, filter)
+            count = self.row_counts.put(
+                collection_id, filter, session.execute(statement, params).scalar()
+            )
+        return count
+
+    def _configure_search(
+        self,
+        session,
+        exact=None,
+        ef_search=None,
+        probes=None,
+        collection_id=None,
+        filter=None,
+    ):
+        """
+        Sets the index search parameters for the current transaction. Exact search
+        disables index scans, which is used automatically when few rows are in the
+        collection or match the filter: an index over the whole table returns only its
+        ef_search nearest rows before they are restricted, often fewer than k of them.
+        """
+        if exact is None:
+            row_count = self._count_rows(session, collection_id, filter)
+            exact = 0 <= row_count < self.exact_search_threshold
+
+        if exact:
+            session.execute(text("SET LOCAL enable_indexscan = off"))
+            return
+        if ef_search is not None:
+            session.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+        if probes is not None:
+            session.execute(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
+
+    def custom_similarity_search_with_scores(
+        self,
+        query,
+        k=3,
+        collection_name=None,
+        filter=None,
+        ef_search=None,
+        probes=None,
+        exact=None,
+    ):
+        """
+        Restrict the search to one collection with collection_name, and to documents whose
+        metadata contains all key/value pairs in filter. Both are applied in SQL before the
+        distance sort. The stored metadata and custom_id are returned in each document's metadata.
+
+        Set ef_search (HNSW) or probes (IVFFlat) to trade recall for speed, or exact to
+        force (True) or skip (False) the exact scan that is used for small collections.
+        """
         query_vector = self.get_vector(query)
+        collection_id = (
+            self.get_collection_id(collection_name) if collection_name else None
+        )
 
         with Session(self.engine) as session:
+            self._configure_search(
+                session, exact, ef_search, probes, collection_id, filter
+            )
+
             # Using cosine similarity for the vector comparison
-            cosine_distance = self.EmbeddingStore.embedding.cosine_distance(
-                query_vector
-            ).label("distance")
+            cosine_distance = (
+                self._embedding_column().cosine_distance(query_vector).label("distance")
+            )
 
             # Querying the EmbeddingStore table
-            results = (
-                session.query(
-                    self.EmbeddingStore.document,
-                    self.EmbeddingStore.custom_id,
-                    cosine_distance,
-                )
-                .order_by(cosine_distance.asc())
-                .limit(k)
-                .all()
+            query = session.query(
+                self.EmbeddingStore.document,
+                self.EmbeddingStore.custom_id,
+                self.EmbeddingStore.cmetadata,
+                cosine_distance,
             )
+            if collection_id is not None:
+                query = query.filter(self.EmbeddingStore.collection_id == collection_id)
+            if filter:
+                query = query.filter(
+                    cast(self.EmbeddingStore.cmetadata, JSONB).contains(filter)
+                )
+            results = query.order_by(cosine_distance.asc()).limit(k).all()
+
         # Calculate the similarity score by subtracting the cosine distance from 1 (_cosine_relevance_score_fn)
-        docs = [(Document(page_content=result[0]), 1 - result[2]) for result in results]
+        docs = [
+            (
+                Document(
+                    page_content=document,
+                    metadata={**(metadata or {}), "custom_id": custom_id},
+                ),
+                1 - distance,
+            )
+            for document, custom_id, metadata, distance in results
+        ]
 
         return docs
 
-    def update_pgvector_collection(
-        self, docs, collection_name, overwrite=False
-    ) -> None:
+    def search_many(
+        self,
+        queries,
+        k=3,
+        collection_name=None,
+        filter=None,
+        ef_search=None,
+        probes=None,
+        exact=None,
+    ):
         """
-        Create a new collection from documents. Set overwrite to True to delete the collection if it already exists.
+        Runs a similarity search for each query and returns one list of (document, score)
+        tuples per query. All queries are embedded in one batched call and searched with a
+        single SQL statement. Takes the same options as custom_similarity_search_with_scores.
         """
-        logging.info(f"Creating new collection: {collection_name}")
+        queries = list(queries)
+        if not queries:
+            return []
+
+        vectors = self.embeddings.embed_documents(queries)
+        collection_id = (
+            self.get_collection_id(collection_name) if collection_name else None
+        )
+        statement = build_search_many_query(
+            self.EmbeddingStore.__tablename__,
+            self.embedding_dimensions,
+            len(queries),
+            with_collection=collection_id is not None,
+            with_filter=bool(filter),
+        )
+        params = build_search_many_params(vectors, k, collection_id, filter)
+
+        with Session(self.engine) as session:
+            self._configure_search(
+                session, exact, ef_search, probes, collection_id, filter
+            )
+            rows = session.execute(statement, params).all()
+
+        return group_search_many_results(rows, len(queries))
+
+    def get_collection_id(self, collection_name):
+        if collection_name not in self._collection_ids:
+            with Session(self.engine) as session:
+                collection = CollectionStore.get_by_name(session, collection_name)
+                if collection is None:
+                    raise ValueError(f"Collection does not exist: {collection_name}")
+                self._collection_ids[collection_name] = collection.uuid
+        return self._collection_ids[collection_name]
+
+    def create_index(
+        self,
+        collection_name=None,
+        method="hnsw",
+        m=16,
+        ef_construction=64,
+        lists=None,
+    ) -> str:
+        """
+        Creates an HNSW or IVFFlat cosine index on the embeddings and returns its name.
+        When collection_name is given, a partial index covering only that collection is
+        created. For IVFFlat, lists defaults to rows / 1000 (sqrt(rows) above 1M rows).
+        """
+        if method not in ("hnsw", "ivfflat"):
+            raise ValueError(f"Unsupported index method: {method}")
+
+        table = self.EmbeddingStore.__tablename__
+        where = ""
+        suffix = "all"
+        if collection_name is not None:
+            collection_id = self.get_collection_id(collection_name)
+            where = f" WHERE collection_id = '{collection_id}'"
+            suffix = collection_id.hex
+
+        if method == "hnsw":
+            options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+        else:
+            if lists is None:
+                with self.engine.connect() as connection:
+                    rows = connection.execute(
+                        text(f"SELECT count(*) FROM {table}{where}")
+                    ).scalar()
+                lists = rows // 1000 if rows <= 1_000_000 else int(rows**0.5)
+            options = f"lists = {max(1, int(lists))}"
+
+        index_name = f"ix_{table}_{method}_{suffix}"[:63]
+        logging.info(f"Creating {method} index: {index_name}")
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} "
+                    f"USING {method} ((embedding::vector({self.embedding_dimensions})) "
+                    f"vector_cosine_ops) WITH ({options}){where}"
+                )
+            )
+        return index_name
+
+    def create_metadata_indexes(self) -> None:
+        """
+        Creates the indexes used to restrict searches before the distance sort: a B-tree
+        on (collection_id, custom_id) for collection filters and incremental syncs, and a
+        GIN index on the metadata for filter predicates.
+        """
+        table = self.EmbeddingStore.__tablename__
+        logging.info(f"Creating metadata indexes on {table}")
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table}_collection_custom_id "
+                    f"ON {table} (collection_id, custom_id)"
+                )
+            )
+            connection.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table}_cmetadata "
+                    f"ON {table} USING gin ((cmetadata::jsonb) jsonb_path_ops)"
+                )
+            )
+
+    def drop_index(self, index_name) -> None:
+        logging.info(f"Dropping index: {index_name}")
+        with self.engine.begin() as connection:
+            connection.execute(text(f'DROP INDEX IF EXISTS "{index_name}"'))
+
+    def get_index_stats(self) -> list:
+        """Returns the name, definition, size and number of scans of each vector index."""
+        query = text(
+            """
+            SELECT i.indexname, i.indexdef,
+                   pg_relation_size(s.indexrelid) AS size_bytes,
+                   s.idx_scan
+            FROM pg_indexes i
+            JOIN pg_stat_user_indexes s ON s.indexrelname = i.indexname
+            WHERE i.tablename = :table
+              AND (i.indexdef ILIKE '%USING hnsw%' OR i.indexdef ILIKE '%USING ivfflat%')
+            """
+        )
+        with self.engine.connect() as connection:
+            result = connection.execute(
+                query, {"table": self.EmbeddingStore.__tablename__}
+            )
+            return [dict(row._mapping) for row in result]
+
+    def _embed_batch(self, batch, max_retries=6):
+        """Embeds a batch of documents, backing off exponentially when rate limited."""
+        texts = [doc.page_content for _, doc in batch]
+        for attempt in range(max_retries):
+            try:
+                return batch, self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if not _is_rate_limit_error(e) or attempt == max_retries - 1:
+                    raise
+                delay = min(60, 2**attempt) + random.uniform(0, 1)
+                logging.warning(f"Rate limited, retrying in {delay:.1f} seconds")
+                time.sleep(delay)
+
+    def _insert_batch(self, collection_id, batch, vectors) -> None:
+        rows = [
+            {
+                "collection_id": collection_id,
+                "embedding": vector,
+                "document": doc.page_content,
+                "cmetadata": doc.metadata,
+                "custom_id": custom_id,
+            }
+            for (custom_id, doc), vector in zip(batch, vectors)
+        ]
+        with Session(self.engine) as session:
+            # A list of parameter sets makes SQLAlchemy use a single executemany
+            session.execute(insert(self.EmbeddingStore), rows)
+            session.commit()
+
+    def _ingest_documents(
+        self, collection_id, docs, ids=None, max_workers=4, max_tokens=20000
+    ) -> int:
+        """
+        Embeds documents in token-bounded batches on a thread pool and inserts each
+        batch as soon as it is embedded. At most two batches per worker are in flight,
+        so memory use does not grow with the number of documents.
+        """
+        inserted = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = set()
+            for batch in batch_documents(docs, ids, max_tokens=max_tokens):
+                pending.add(executor.submit(self._embed_batch, batch))
+                if len(pending) < max_workers * 2:
+                    continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch_docs, vectors = future.result()
+                    self._insert_batch(collection_id, batch_docs, vectors)
+                    inserted += len(batch_docs)
+
+            for future in pending:
+                batch_docs, vectors = future.result()
+                self._insert_batch(collection_id, batch_docs, vectors)
+                inserted += len(batch_docs)
+        return inserted
+
+    def _get_or_create_collection_id(self, collection_name):
         with self.engine.connect() as connection:
-            pgvector = PGVector.from_documents(
-                embedding=self.embeddings,
-                documents=docs,
+            pgvector = PGVector(
                 collection_name=collection_name,
                 connection_string=self.cnx,
                 connection=connection,
-                pre_delete_collection=overwrite,
+                embedding_function=self.embeddings,
+            )
+        with Session(self.engine) as session:
+            collection_id = pgvector.get_collection(session).uuid
+        self._collection_ids[collection_name] = collection_id
+        return collection_id
+
+    def update_pgvector_collection(
+        self, docs, collection_name, overwrite=False, max_workers=4
+    ) -> None:
+        """
+        Create a new collection from documents. Set overwrite to True to replace the documents if the collection already exists.
+        Documents are embedded concurrently in batches by max_workers threads.
+        """
+        logging.info(f"Creating new collection: {collection_name}")
+        collection_id = self._get_or_create_collection_id(collection_name)
+
+        # Old documents are deleted only after all new ones are inserted, and new ones
+        # are removed if ingest fails, so a failed update leaves the collection as it was
+        old_ids = self.get_stored_ids(collection_id)
+        try:
+            inserted = self._ingest_documents(
+                collection_id, docs, max_workers=max_workers
             )
+        except Exception:
+            self._delete_ids(
+                collection_id, self.get_stored_ids(collection_id) - old_ids
+            )
+            raise
+        if overwrite:
+            self._delete_ids(collection_id, old_ids)
+        logging.info(f"Inserted {inserted} documents into {collection_name}")
+
+    def get_stored_ids(self, collection_id) -> set:
+        with Session(self.engine) as session:
+            rows = session.query(self.EmbeddingStore.custom_id).filter(
+                self.EmbeddingStore.collection_id == collection_id
+            )
+            return {row[0] for row in rows}
+
+    def _delete_ids(self, collection_id, custom_ids) -> None:
+        custom_ids = list(custom_ids)
+        with Session(self.engine) as session:
+            for i in range(0, len(custom_ids), 1000):
+                session.query(self.EmbeddingStore).filter(
+                    self.EmbeddingStore.collection_id == collection_id,
+                    self.EmbeddingStore.custom_id.in_(custom_ids[i : i + 1000]),
+                ).delete(synchronize_session=False)
+            session.commit()
+
+    def sync_pgvector_collection(self, docs, collection_name, max_workers=4) -> dict:
+        """
+        Incrementally syncs a collection with the given documents. Each chunk is stored
+        with its content hash as custom_id, so only chunks that are not stored yet are
+        embedded and inserted, and stored chunks that are no longer present are deleted.
+        """
+        logging.info(f"Syncing collection: {collection_name}")
+        collection_id = self._get_or_create_collection_id(collection_name)
+
+        # Identical chunks share a fingerprint and are only stored once
+        fingerprints = {}
+        for doc in docs:
+            fingerprints.setdefault(fingerprint_document(doc), doc)
+
+        stored_ids = self.get_stored_ids(collection_id)
+        new_ids = [id for id in fingerprints if id not in stored_ids]
+        removed_ids = stored_ids - fingerprints.keys()
+
+        # Insert before deleting, so a failed insert never leaves chunks missing
+        inserted = self._ingest_documents(
+            collection_id,
+            [fingerprints[id] for id in new_ids],
+            ids=new_ids,
+            max_workers=max_workers,
+        )
+        if removed_ids:
+            self._delete_ids(collection_id, removed_ids)
+
+        stats = {
+            "inserted": inserted,
+            "deleted": len(removed_ids),
+            "unchanged": len(fingerprints) - len(new_ids),
+        }
+        logging.info(f"Synced collection {collection_name}: {stats}")
+        return stats
 
     def get_collections(self) -> list:
         with self.engine.connect() as connection:
@@ -78,9 +623,16 @@ class PgvectorService:
                 collections = []
         return collections
 
-    def update_collection(self, docs, collection_name):
-        """Updates a collection with data from a given blob URL."""
+    def update_collection(self, docs, collection_name, incremental=False):
+        """
+        Updates a collection with data from a given blob URL. With incremental set to True
+        only the changed chunks are embedded and written instead of rebuilding the collection.
+        """
         logging.info(f"Updating collection: {collection_name}")
+        if docs is not None and incremental:
+            self.sync_pgvector_collection(docs, collection_name)
+            return
+
         collections = self.get_collections()
 
         if docs is not None:
@@ -90,6 +642,7 @@ class PgvectorService:
     def delete_collection(self, collection_name):
         """Deletes a collection based on the collection name."""
         logging.info(f"Deleting collection: {collection_name}")
+        self._collection_ids.pop(collection_name, None)
         with self.engine.connect() as connection:
             pgvector = PGVector(
                 collection_name=collection_name,
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def rate_limits_from_env():
+    """
+    Requests per minute and burst size allowed per user, channel and workspace, with
+    the per-minute rates read from SLACK_USER_RATE_LIMIT, SLACK_CHANNEL_RATE_LIMIT and
+    SLACK_TEAM_RATE_LIMIT.
+    """
+    return {
+        "user": (int(os.environ.get("SLACK_USER_RATE_LIMIT", "5")), 3),
+        "channel": (int(os.environ.get("SLACK_CHANNEL_RATE_LIMIT", "20")), 10),
+        "team": (int(os.environ.get("SLACK_TEAM_RATE_LIMIT", "60")), 30),
+    }
+
+
+class TokenBucket:
+    """
+    Allows bursts of up to capacity requests, refilled at rate requests per second.
+    Not thread-safe on its own, RateLimiter holds a lock while using it.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+
+class RateLimiter:
+    """
+    Token bucket rate limits per user, channel and workspace. A request is only
+    allowed if every bucket it falls into has a token left.
+    """
+
+    def __init__(self, limits, max_buckets=10000):
+        """
+        Args:
+            limits (dict): Maps a scope ("user", "channel" or "team") to a tuple of
+                (requests per minute, burst size).
+            max_buckets (int): Number of buckets kept before the least recently used are dropped.
+        """
+        self.limits = limits
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _bucket(self, scope, key):
+        bucket = self.buckets.get((scope, key))
+        if bucket is None:
+            per_minute, burst = self.limits[scope]
+            bucket = TokenBucket(per_minute / 60, burst)
+            self.buckets[(scope, key)] = bucket
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        self.buckets.move_to_end((scope, key))
+        return bucket
+
+    def allow(self, **keys):
+        """
+        Takes a token from the bucket of each given scope, e.g. allow(user="U1", team="T1").
+        Returns:
+            bool: False if any bucket is empty, in which case no tokens are taken.
+        """
+        with self.lock:
+            buckets = [
+                self._bucket(scope, key)
+                for scope, key in keys.items()
+                if scope in self.limits and key is not None
+            ]
+            for bucket in buckets:
+                bucket.refill()
+            if any(bucket.tokens < 1 for bucket in buckets):
+                return False
+            for bucket in buckets:
+                bucket.tokens -= 1
+            return True
+
+
+class AdmissionController:
+    """
+    Decides whether a request is started, queued or turned away, in front of a JobQueue.
+    The queue's worker count is the global concurrency cap.
+    """
+
+    ACCEPTED = "accepted"
+    QUEUED = "queued"
+    RATE_LIMITED = "rate_limited"
+    BUSY = "busy"
+
+    def __init__(self, jobs, rate_limiter):
+        self.jobs = jobs
+        self.rate_limiter = rate_limiter
+        self.counts = {
+            status: 0
+            for status in (self.ACCEPTED, self.QUEUED, self.RATE_LIMITED, self.BUSY)
+        }
+        self.lock = threading.Lock()
+
+    def submit(self, keys, func, *args, **kwargs):
+        """
+        Rate limits the request by keys and adds the job to the queue.
+        Returns:
+            tuple: The status, and the job's position in the queue if it was queued.
+        """
+        position = 0
+        if not self.rate_limiter.allow(**keys):
+            status = self.RATE_LIMITED
+        elif not self.jobs.submit(func, *args, **kwargs):
+            status = self.BUSY
+        else:
+            # Jobs beyond the number of workers have to wait for a free one
+            waiting = self.jobs.active + self.jobs.depth - len(self.jobs.workers)
+            position = max(waiting, 0)
+            status = self.QUEUED if waiting > 0 else self.ACCEPTED
+
+        with self.lock:
+            self.counts[status] += 1
+        return status, position
+
+    def metrics(self):
+        return {
+            "queue_depth": self.jobs.depth,
+            "active_jobs": self.jobs.active,
+            "workers": len(self.jobs.workers),
+            "requests": dict(self.counts),
+        }
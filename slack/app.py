@@ -1,11 +1,14 @@
 import os
-from slack_sdk import WebClient
+import threading
 from slack_sdk.errors import SlackApiError
 from slack_bolt.adapter.flask import SlackRequestHandler
 from slack_bolt import App
 from dotenv import find_dotenv, load_dotenv
-from flask import Flask, request
-from functions import draft_email
+from flask import Flask, jsonify, request
+from functions import draft_email, split_fresh_keyword, stream_email
+from admission import AdmissionController, RateLimiter, rate_limits_from_env
+from jobs import EventDeduplicator, JobQueue
+from streaming import MessageStreamer
 
 # Load environment variables from .env file
 load_dotenv(find_dotenv())
@@ -15,6 +18,9 @@ SLACK_BOT_TOKEN = os.environ["SLACK_BOT_TOKEN"]
 SLACK_SIGNING_SECRET = os.environ["SLACK_SIGNING_SECRET"]
 SLACK_BOT_USER_ID = os.environ["SLACK_BOT_USER_ID"]
 
+# Stream drafts into the channel as they are generated instead of waiting for the full reply
+STREAM_REPLIES = os.environ.get("SLACK_STREAM_REPLIES", "true").lower() == "true"
+
 # Initialize the Slack app
 app = App(token=SLACK_BOT_TOKEN)
 
@@ -23,6 +29,17 @@ app = App(token=SLACK_BOT_TOKEN)
 flask_app = Flask(__name__)
 handler = SlackRequestHandler(app)
 
+# Drafts are written by background workers so events are acknowledged right away
+jobs = JobQueue(
+    num_workers=int(os.environ.get("SLACK_NUM_WORKERS", "4")),
+    max_size=int(os.environ.get("SLACK_MAX_QUEUE_SIZE", "100")),
+)
+deduplicator = EventDeduplicator()
+
+# Requests per minute and burst size allowed per user, channel and workspace
+rate_limiter = RateLimiter(rate_limits_from_env())
+admission = AdmissionController(jobs, rate_limiter)
+
 
 def get_bot_user_id():
     """
@@ -31,9 +48,8 @@ def get_bot_user_id():
         str: The bot user ID.
     """
     try:
-        # Initialize the Slack client with your bot token
-        slack_client = WebClient(token=os.environ["SLACK_BOT_TOKEN"])
-        response = slack_client.auth_test()
+        # Reuse the app's Slack client instead of creating one per call
+        response = app.client.auth_test()
         return response["user_id"]
     except SlackApiError as e:
         print(f"Error: {e}")
@@ -54,25 +70,113 @@ def my_function(text):
     return response
 
 
+def run_when_set(event, func, *args, **kwargs):
+    """
+    Runs func once event is set. Used so that a job cannot post its draft before the
+    reply that acknowledges the mention is in the channel.
+    """
+    event.wait()
+    func(*args, **kwargs)
+
+
+def process_mention(text, say, use_cache=True):
+    """
+    Drafts the email reply and sends it to the channel. Runs on a background worker.
+
+    Args:
+        text (str): The message text without the bot mention.
+        say (callable): A function for sending a response to the channel.
+        use_cache (bool): Whether a cached draft for the same text may be reused.
+    """
+    # response = my_function(text)
+    response = draft_email(text, use_cache=use_cache)
+    say(response)
+
+
+def stream_mention(text, client, channel, use_cache=True):
+    """
+    Drafts the email reply and streams it into a single message that is updated as the
+    text is generated. Runs on a background worker.
+
+    Args:
+        text (str): The message text without the bot mention.
+        client (WebClient): The Slack client used to post and update the message.
+        channel (str): The channel to reply in.
+        use_cache (bool): Whether a cached draft for the same text may be reused.
+    """
+    streamer = MessageStreamer(client, channel)
+    for chunk in stream_email(text, use_cache=use_cache):
+        streamer.append(chunk)
+    streamer.finish()
+
+
 @app.event("app_mention")
-def handle_mentions(body, say):
+def handle_mentions(body, say, client):
     """
     Event listener for mentions in Slack.
-    When the bot is mentioned, this function processes the text and sends a response.
+    When the bot is mentioned, this function queues the text for processing and returns
+    immediately, so the event is acknowledged well within Slack's 3 second limit.
 
     Args:
         body (dict): The event data received from Slack.
         say (callable): A function for sending a response to the channel.
+        client (WebClient): The Slack client, used to stream the reply.
     """
+    # Slack redelivers events it thinks were not handled, only draft each one once
+    if deduplicator.is_duplicate(body["event_id"]):
+        return
+
     text = body["event"]["text"]
 
     mention = f"<@{SLACK_BOT_USER_ID}>"
     text = text.replace(mention, "").strip()
 
-    say("Sure, I'll get right on that!")
-    # response = my_function(text)
-    response = draft_email(text)
-    say(response)
+    # Mentions containing the fresh keyword always get a newly generated draft
+    text, fresh = split_fresh_keyword(text)
+
+    event = body["event"]
+    keys = {
+        "user": event.get("user"),
+        "channel": event["channel"],
+        "team": body.get("team_id"),
+    }
+    # Cached drafts are ready at once, so the job waits until the acknowledgement is sent
+    acknowledged = threading.Event()
+    if STREAM_REPLIES:
+        status, position = admission.submit(
+            keys,
+            run_when_set,
+            acknowledged,
+            stream_mention,
+            text,
+            client,
+            event["channel"],
+            use_cache=not fresh,
+        )
+    else:
+        status, position = admission.submit(
+            keys,
+            run_when_set,
+            acknowledged,
+            process_mention,
+            text,
+            say,
+            use_cache=not fresh,
+        )
+
+    try:
+        if status == admission.RATE_LIMITED:
+            say(
+                "You're sending me requests a bit too fast. Please wait a minute and try again."
+            )
+        elif status == admission.BUSY:
+            say("Sorry, I'm too busy right now. Please try again in a few minutes.")
+        elif status == admission.QUEUED:
+            say(f"I'm a bit busy, your request is queued (position {position}).")
+        else:
+            say("Sure, I'll get right on that!")
+    finally:
+        acknowledged.set()
 
 
 @flask_app.route("/slack/events", methods=["POST"])
@@ -87,6 +191,17 @@ def slack_events():
     return handler.handle(request)
 
 
+@flask_app.route("/slack/metrics", methods=["GET"])
+def slack_metrics():
+    """
+    Route for monitoring the bot's load.
+
+    Returns:
+        Response: The queue depth, active jobs and admission counts as JSON.
+    """
+    return jsonify(admission.metrics())
+
+
 # Run the Flask app
 if __name__ == "__main__":
     flask_app.run()
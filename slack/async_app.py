@@ -0,0 +1,98 @@
+import asyncio
+import os
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from dotenv import find_dotenv, load_dotenv
+from admission import RateLimiter, rate_limits_from_env
+from functions import adraft_email, split_fresh_keyword
+from jobs import EventDeduplicator
+
+# Load environment variables from .env file
+load_dotenv(find_dotenv())
+
+
+def create_app(
+    token=None,
+    signing_secret=None,
+    bot_user_id=None,
+    client=None,
+    draft=adraft_email,
+    max_concurrent_drafts=200,
+    rate_limits=None,
+    **app_kwargs,
+):
+    """
+    Create an async Bolt app that handles mentions like app.py, but on a single event
+    loop, so one process can wait on hundreds of LLM calls at the same time.
+
+    Args:
+        token (str): The bot token, defaults to SLACK_BOT_TOKEN.
+        signing_secret (str): The signing secret, defaults to SLACK_SIGNING_SECRET.
+        bot_user_id (str): The bot user ID, defaults to SLACK_BOT_USER_ID.
+        client (AsyncWebClient): Optional Slack client, e.g. one pointing at a fake Slack API.
+        draft (callable): Coroutine function that drafts the reply.
+        max_concurrent_drafts (int): Global cap on the number of drafts in flight.
+        rate_limits (dict): Requests per minute and burst size per scope, see RateLimiter.
+
+    Returns:
+        AsyncApp: The Bolt app.
+    """
+    token = token or os.environ.get("SLACK_BOT_TOKEN")
+    signing_secret = signing_secret or os.environ.get("SLACK_SIGNING_SECRET")
+    bot_user_id = bot_user_id or os.environ.get("SLACK_BOT_USER_ID")
+
+    app = AsyncApp(
+        token=token, signing_secret=signing_secret, client=client, **app_kwargs
+    )
+    deduplicator = EventDeduplicator()
+    rate_limiter = RateLimiter(rate_limits or rate_limits_from_env())
+    drafts = asyncio.Semaphore(max_concurrent_drafts)
+
+    @app.event("app_mention")
+    async def handle_mentions(body, say):
+        """
+        Event listener for mentions in Slack.
+        Bolt acknowledges the event before running this listener, which then awaits the
+        draft without blocking other events.
+
+        Args:
+            body (dict): The event data received from Slack.
+            say (callable): A coroutine function for sending a response to the channel.
+        """
+        # Slack redelivers events it thinks were not handled, only draft each one once
+        if deduplicator.is_duplicate(body["event_id"]):
+            return
+
+        event = body["event"]
+        mention = f"<@{bot_user_id}>"
+        text = event["text"].replace(mention, "").strip()
+        text, fresh = split_fresh_keyword(text)
+
+        keys = {
+            "user": event.get("user"),
+            "channel": event["channel"],
+            "team": body.get("team_id"),
+        }
+        if not rate_limiter.allow(**keys):
+            await say(
+                "You're sending me requests a bit too fast. Please wait a minute and try again."
+            )
+            return
+
+        await say("Sure, I'll get right on that!")
+        async with drafts:
+            response = await draft(text, use_cache=not fresh)
+        await say(response)
+
+    return app
+
+
+# Run the async app, with Socket Mode if an app-level token is set
+if __name__ == "__main__":
+    app = create_app()
+    if os.environ.get("SLACK_APP_TOKEN"):
+        handler = AsyncSocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
+        asyncio.run(handler.start_async())
+    else:
+        # Serves the Events API on /slack/events with aiohttp
+        app.start(port=int(os.environ.get("PORT", "3000")))
@@ -6,14 +6,30 @@ from langchain.prompts.chat import (
     SystemMessagePromptTemplate,
     HumanMessagePromptTemplate,
 )
+from response_cache import ResponseCache, SQLiteResponseCache, make_cache_key
+import os
+import re
+import threading
 
 load_dotenv(find_dotenv())
 
+# Bump this when the prompt changes, so drafts made with the old prompt are not reused
+PROMPT_VERSION = "1"
 
-def draft_email(user_input, name="Dave"):
-    chat = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=1)
+# Include this keyword in a message to skip the cache and get a fresh draft
+FRESH_KEYWORD = "--fresh"
 
-    template = """
+# Set SLACK_RESPONSE_CACHE_PATH to share cached drafts between gunicorn workers
+cache_ttl = int(os.environ.get("SLACK_RESPONSE_CACHE_TTL", "3600"))
+if os.environ.get("SLACK_RESPONSE_CACHE_PATH"):
+    response_cache = SQLiteResponseCache(
+        os.environ["SLACK_RESPONSE_CACHE_PATH"], ttl=cache_ttl
+    )
+else:
+    response_cache = ResponseCache(ttl=cache_ttl)
+
+
+template = """
     
     You are a helpful assistant that drafts an email reply based on an a new email.
     
@@ -27,17 +43,107 @@ def draft_email(user_input, name="Dave"):
     
     """
 
-    signature = f"Kind regards, \n\{name}"
-    system_message_prompt = SystemMessagePromptTemplate.from_template(template)
+system_message_prompt = SystemMessagePromptTemplate.from_template(template)
 
-    human_template = "Here's the email to reply to and consider any other comments from the user for reply as well: {user_input}"
-    human_message_prompt = HumanMessagePromptTemplate.from_template(human_template)
+human_template = "Here's the email to reply to and consider any other comments from the user for reply as well: {user_input}"
+human_message_prompt = HumanMessagePromptTemplate.from_template(human_template)
+
+chat_prompt = ChatPromptTemplate.from_messages(
+    [system_message_prompt, human_message_prompt]
+)
+
+# Chains are built once per model and temperature and shared by all requests, so each
+# request reuses the chat model's HTTP client and its pooled connections
+_chains = {}
+_chains_lock = threading.Lock()
+
+
+def get_email_chain(model_name="gpt-3.5-turbo", temperature=1):
+    """
+    Get the shared email drafting chain for a model and temperature, creating it on first use.
+    Returns:
+        LLMChain: The chain, safe to use from multiple threads.
+    """
+    key = (model_name, temperature)
+    with _chains_lock:
+        if key not in _chains:
+            chat = ChatOpenAI(model_name=model_name, temperature=temperature)
+            _chains[key] = LLMChain(llm=chat, prompt=chat_prompt)
+        return _chains[key]
+
+
+def split_fresh_keyword(text):
+    """
+    Remove the fresh keyword from a message.
+    Returns:
+        tuple: The text without the keyword, and whether the keyword was present.
+    """
+    # Only match the keyword as a whole word, not as part of e.g. "--freshness"
+    pattern = rf"(?<!\S){re.escape(FRESH_KEYWORD)}(?!\S)"
+    text, count = re.subn(pattern, "", text)
+    return text.strip(), count > 0
 
-    chat_prompt = ChatPromptTemplate.from_messages(
-        [system_message_prompt, human_message_prompt]
-    )
 
-    chain = LLMChain(llm=chat, prompt=chat_prompt)
-    response = chain.run(user_input=user_input, signature=signature, name=name)
+class _Draft:
+    """
+    The cache lookup, prompt inputs and cache store shared by draft_email, adraft_email
+    and stream_email.
+    """
+
+    def __init__(self, user_input, name, model_name, temperature, use_cache):
+        self.key = make_cache_key(
+            user_input, name, f"{model_name}@{temperature}", PROMPT_VERSION
+        )
+        self.cached = response_cache.get(self.key) if use_cache else None
+        self.chain = get_email_chain(model_name, temperature)
+        self.inputs = {
+            "user_input": user_input,
+            "signature": f"Kind regards, \n{name}",
+            "name": name,
+        }
+
+    def save(self, response):
+        response_cache.set(self.key, response)
+        return response
+
+
+def draft_email(
+    user_input, name="Dave", model_name="gpt-3.5-turbo", temperature=1, use_cache=True
+):
+    draft = _Draft(user_input, name, model_name, temperature, use_cache)
+    if draft.cached is not None:
+        return draft.cached
+    return draft.save(draft.chain.run(**draft.inputs))
+
+
+async def adraft_email(
+    user_input, name="Dave", model_name="gpt-3.5-turbo", temperature=1, use_cache=True
+):
+    """
+    Async version of draft_email, so one event loop can wait on many drafts at once.
+    """
+    draft = _Draft(user_input, name, model_name, temperature, use_cache)
+    if draft.cached is not None:
+        return draft.cached
+    return draft.save(await draft.chain.arun(**draft.inputs))
+
+
+def stream_email(
+    user_input, name="Dave", model_name="gpt-3.5-turbo", temperature=1, use_cache=True
+):
+    """
+    Draft an email reply like draft_email, but yield the text in chunks as it is generated.
+    A cached draft is yielded in one piece.
+    Yields:
+        str: The next piece of the draft.
+    """
+    draft = _Draft(user_input, name, model_name, temperature, use_cache)
+    if draft.cached is not None:
+        yield draft.cached
+        return
 
-    return response
+    chunks = []
+    for chunk in draft.chain.llm.stream(chat_prompt.format_messages(**draft.inputs)):
+        chunks.append(chunk.content)
+        yield chunk.content
+    draft.save("".join(chunks))
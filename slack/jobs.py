@@ -0,0 +1,85 @@
+import logging
+import queue
+import threading
+import time
+
+
+class JobQueue:
+    """
+    Bounded queue of background jobs, processed by a fixed pool of worker threads.
+    Lets the Slack event handler return right away while the LLM call runs in the
+    background, without starting an unbounded number of threads.
+    """
+
+    def __init__(self, num_workers=4, max_size=100):
+        self.jobs = queue.Queue(maxsize=max_size)
+        self.active = 0
+        self.active_lock = threading.Lock()
+        self.workers = [
+            threading.Thread(target=self._work, daemon=True) for _ in range(num_workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    @property
+    def depth(self):
+        """Number of jobs waiting for a free worker."""
+        return self.jobs.qsize()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Adds a job to the queue.
+        Returns:
+            bool: False if the queue is full and the job was not added.
+        """
+        try:
+            self.jobs.put_nowait((func, args, kwargs))
+            return True
+        except queue.Full:
+            return False
+
+    def _work(self):
+        while True:
+            func, args, kwargs = self.jobs.get()
+            with self.active_lock:
+                self.active += 1
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                logging.exception(f"Background job {func.__name__} failed")
+            finally:
+                with self.active_lock:
+                    self.active -= 1
+                self.jobs.task_done()
+
+
+class EventDeduplicator:
+    """
+    Remembers recently processed Slack event IDs, so events that Slack redelivers
+    (for example after a slow acknowledgement) are only processed once.
+    """
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self.seen_at = {}
+        self.lock = threading.Lock()
+
+    def is_duplicate(self, event_id):
+        """
+        Records the event ID and checks whether it was seen before.
+        Returns:
+            bool: True if the event was already processed within the TTL.
+        """
+        now = time.monotonic()
+        with self.lock:
+            # IDs are stored in the order they were seen, so expired ones come first
+            while self.seen_at:
+                id, seen = next(iter(self.seen_at.items()))
+                if now - seen <= self.ttl:
+                    break
+                del self.seen_at[id]
+
+            if event_id in self.seen_at:
+                return True
+            self.seen_at[event_id] = now
+            return False
@@ -0,0 +1,165 @@
+"""
+Replays recorded Slack event payloads against the async app without a Slack workspace.
+
+A local fake Slack Web API records the messages the bot posts, and drafts come from a
+fake LLM that waits --llm-delay seconds, so the run is offline and shows how many
+mentions one process can have in flight. Example:
+
+    python replay_events.py events/app_mention.json --repeat 100 --llm-delay 2
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from aiohttp import web
+from slack_bolt.request.async_request import AsyncBoltRequest
+from slack_sdk.web.async_client import AsyncWebClient
+
+from async_app import create_app
+
+
+class FakeSlackApi:
+    """Minimal stand-in for the Slack Web API that records every call."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        self.calls.append((method, params))
+
+        response = {"ok": True}
+        if method == "auth.test":
+            response.update(user_id="U0BOT", bot_id="B0BOT", team_id="T0001")
+        elif method in ("chat.postMessage", "chat.update"):
+            response.update(channel=params.get("channel"), ts=f"{time.time():.6f}")
+        return web.json_response(response)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/api/{method}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        return f"http://127.0.0.1:{port}/api/"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    def messages(self):
+        return [params for method, params in self.calls if method == "chat.postMessage"]
+
+
+def load_payloads(paths, repeat=1):
+    """Loads event payloads from JSON files holding one payload or a list of them."""
+    payloads = []
+    for path in paths:
+        with open(path) as f:
+            data = json.load(f)
+        payloads.extend(data if isinstance(data, list) else [data])
+
+    # Give repeated events their own IDs so they are not skipped as redeliveries
+    replayed = []
+    for i in range(repeat):
+        for payload in payloads:
+            payload = json.loads(json.dumps(payload))
+            if i:
+                payload["event_id"] = f"{payload['event_id']}-{i}"
+            replayed.append(payload)
+    return replayed
+
+
+async def wait_for_listeners(baseline, timeout):
+    """Waits until the listener tasks Bolt started in the background have finished."""
+    deadline = time.monotonic() + timeout
+    while len(asyncio.all_tasks()) > baseline and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def replay(
+    paths, repeat=1, llm_delay=1.0, live_llm=False, rate_limit=False, timeout=60
+):
+    slack_api = FakeSlackApi()
+    base_url = await slack_api.start()
+
+    async def fake_draft(text, use_cache=True):
+        await asyncio.sleep(llm_delay)
+        return f"Hi Dave, here's a draft for your reply:\n{text}"
+
+    app_kwargs = {}
+    if not live_llm:
+        app_kwargs["draft"] = fake_draft
+    if not rate_limit:
+        # Replayed events come from a handful of users, so only rate limit when asked
+        app_kwargs["rate_limits"] = {"team": (10**9, 10**9)}
+    app = create_app(
+        signing_secret="replay",
+        bot_user_id="U0BOT",
+        client=AsyncWebClient(token="xoxb-replay", base_url=base_url),
+        request_verification_enabled=False,
+        **app_kwargs,
+    )
+
+    payloads = load_payloads(paths, repeat)
+    baseline = len(asyncio.all_tasks())
+    start = time.perf_counter()
+    responses = await asyncio.gather(
+        *(
+            app.async_dispatch(
+                AsyncBoltRequest(
+                    body=json.dumps(payload),
+                    headers={"content-type": ["application/json"]},
+                )
+            )
+            for payload in payloads
+        )
+    )
+    ack_time = time.perf_counter() - start
+    await wait_for_listeners(baseline, timeout)
+    total_time = time.perf_counter() - start
+    await slack_api.stop()
+
+    return {
+        "events": len(payloads),
+        "acknowledged": sum(response.status == 200 for response in responses),
+        "ack_time_s": ack_time,
+        "total_time_s": total_time,
+        "messages_posted": len(slack_api.messages()),
+        "messages": slack_api.messages(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("payloads", nargs="+", help="JSON files with event payloads")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--llm-delay", type=float, default=1.0)
+    parser.add_argument(
+        "--live-llm", action="store_true", help="Draft with the real OpenAI model"
+    )
+    parser.add_argument(
+        "--rate-limit", action="store_true", help="Apply the app's rate limits"
+    )
+    parser.add_argument("--verbose", action="store_true", help="Print posted messages")
+    args = parser.parse_args()
+
+    result = asyncio.run(
+        replay(
+            args.payloads, args.repeat, args.llm_delay, args.live_llm, args.rate_limit
+        )
+    )
+    if not args.verbose:
+        result.pop("messages")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
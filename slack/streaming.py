@@ -0,0 +1,81 @@
+import time
+
+from slack_sdk.errors import SlackApiError
+
+
+class MessageStreamer:
+    """
+    Posts a Slack message and keeps updating it with chat.update as more text streams in.
+
+    Updates are throttled to at most one per interval seconds, unless max_pending
+    chunks have arrived since the last update. When Slack rate limits an update,
+    the next one waits for the Retry-After period.
+    """
+
+    def __init__(self, client, channel, thread_ts=None, interval=0.5, max_pending=50):
+        self.client = client
+        self.channel = channel
+        self.thread_ts = thread_ts
+        self.interval = interval
+        self.max_pending = max_pending
+
+        self.ts = None
+        self.text = ""
+        self.pending = 0
+        self.last_update = 0.0
+        self.next_update_allowed = 0.0
+
+    def append(self, chunk):
+        """Adds a chunk of text and updates the message if the throttle allows it."""
+        self.text += chunk
+        self.pending += 1
+
+        now = time.monotonic()
+        if now < self.next_update_allowed or not self.text.strip():
+            return
+        if now - self.last_update >= self.interval or self.pending >= self.max_pending:
+            self._send()
+
+    def finish(self):
+        """Sends the complete text, waiting out any rate limit."""
+        if not self.text.strip():
+            return
+        # The message already shows the whole text, another update would be wasted
+        if self.ts is not None and self.pending == 0:
+            return
+        while True:
+            delay = self.next_update_allowed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if self._send():
+                return
+
+    def _send(self):
+        """
+        Posts the message, or updates it once it exists.
+        Returns:
+            bool: False if Slack rate limited the request.
+        """
+        try:
+            if self.ts is None:
+                response = self.client.chat_postMessage(
+                    channel=self.channel, text=self.text, thread_ts=self.thread_ts
+                )
+                self.ts = response["ts"]
+            else:
+                self.client.chat_update(
+                    channel=self.channel, ts=self.ts, text=self.text
+                )
+        except SlackApiError as e:
+            if e.response.status_code != 429:
+                raise
+            headers = e.response.headers
+            retry_after = int(
+                headers.get("Retry-After") or headers.get("retry-after") or 1
+            )
+            self.next_update_allowed = time.monotonic() + retry_after
+            return False
+
+        self.pending = 0
+        self.last_update = time.monotonic()
+        return True
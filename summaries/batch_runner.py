@@ -0,0 +1,206 @@
+"""
+Summarizes a batch of recordings and web pages listed in a manifest. Example:
+
+    python batch_runner.py manifest.json --output-dir reports
+
+The manifest is a JSON list of items like these:
+
+    {"id": "standup-0412", "audio": "recordings/standup.mp3", "participants": ["Alice"]}
+    {"id": "pricing-page", "url": "https://example.com/pricing"}
+
+Every item moves through its stages (transcribe or fetch, summarize, pdf) as
+soon as its previous stage is done, so one item can be rendered while another is
+still being transcribed. Finished stages are appended to a progress file, and a batch
+that is run again picks up where it left off.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from summaries_refactored import (
+    export_to_pdf,
+    load_web_content,
+    summarize_page_with_title,
+    summarize_with_title,
+)
+from transcription import create_transcription_pool, transcribe_file
+
+STAGES = {
+    "audio": ["transcribe", "summarize", "pdf"],
+    "url": ["fetch", "summarize", "pdf"],
+}
+
+
+class Progress:
+    """Results of finished stages, kept in an append-only JSON lines file."""
+
+    def __init__(self, path):
+        self.results = defaultdict(dict)
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line may have been cut off by a crash
+                        continue
+                    self.results[record["id"]][record["stage"]] = record["result"]
+        self.file = open(path, "a")
+
+    def done(self, item_id, stage, result):
+        self.results[item_id][stage] = result
+        record = {"id": item_id, "stage": stage, "result": result}
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def item_id(item):
+    return item.get("id") or item.get("audio") or item["url"]
+
+
+class BatchRunner:
+    """
+    Runs the items of a batch concurrently, with each kind of stage on the pool that
+    suits it: transcription in worker processes, web fetches and LLM calls in an I/O
+    thread pool behind their own concurrency limits, and PDF rendering in threads.
+    """
+
+    def __init__(
+        self,
+        output_dir="reports",
+        progress_path=None,
+        model_name=None,
+        transcribe_workers=None,
+        fetch_concurrency=8,
+        llm_concurrency=8,
+        pdf_workers=4,
+    ):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self.progress = Progress(
+            progress_path or os.path.join(output_dir, "progress.jsonl")
+        )
+        self.model_name = model_name
+        self.transcribe_workers = transcribe_workers
+        self.fetch_concurrency = fetch_concurrency
+        self.llm_concurrency = llm_concurrency
+        self.pdf_workers = pdf_workers
+
+    async def run(self, items):
+        """
+        Run all items of a batch. A failed item does not stop the others, it is
+        retried from its failed stage the next time the batch runs.
+
+        Returns:
+            dict: The PDF path, or the error, by item ID.
+        """
+        self.fetches = asyncio.Semaphore(self.fetch_concurrency)
+        self.llm_calls = asyncio.Semaphore(self.llm_concurrency)
+        transcribe_pool, _ = create_transcription_pool(
+            self.model_name, self.transcribe_workers
+        )
+        io_pool = ThreadPoolExecutor(self.fetch_concurrency + self.llm_concurrency)
+        pdf_pool = ThreadPoolExecutor(self.pdf_workers)
+        self.pools = {"transcribe": transcribe_pool, "io": io_pool, "pdf": pdf_pool}
+
+        try:
+            results = await asyncio.gather(
+                *(self.run_item(item) for item in items), return_exceptions=True
+            )
+        finally:
+            for pool in self.pools.values():
+                pool.shutdown()
+            self.progress.close()
+
+        return {
+            item_id(item): (
+                f"error: {result!r}" if isinstance(result, Exception) else result
+            )
+            for item, result in zip(items, results)
+        }
+
+    async def run_item(self, item):
+        results = self.progress.results[item_id(item)]
+        kind = "audio" if "audio" in item else "url"
+        for stage in STAGES[kind]:
+            if stage not in results:
+                result = await self.run_stage(stage, item, results)
+                self.progress.done(item_id(item), stage, result)
+        return results["pdf"]
+
+    async def run_stage(self, stage, item, results):
+        if stage == "transcribe":
+            return await self.run_in(
+                "transcribe", transcribe_file, item["audio"], self.model_name
+            )
+        if stage == "fetch":
+            async with self.fetches:
+                return await self.run_in("io", load_web_content, item["url"])
+        if stage == "summarize":
+            if "fetch" in results:
+                # Pages that have not changed reuse their cached summary and title
+                text, summarize = results["fetch"], summarize_page_with_title
+            else:
+                text, summarize = results["transcribe"], summarize_with_title
+            async with self.llm_calls:
+                summary, title = await self.run_in("io", summarize, text)
+            return {"summary": summary, "title": title}
+        if stage == "pdf":
+            name = re.sub(r"[^\w-]+", "-", item_id(item)).strip("-")
+            filename = os.path.join(self.output_dir, f"{name}.pdf")
+            await self.run_in(
+                "pdf",
+                export_to_pdf,
+                results["summarize"]["summary"],
+                results["summarize"]["title"],
+                item.get("participants", []),
+                filename,
+            )
+            return filename
+        raise ValueError(f"Unknown stage: {stage}")
+
+    async def run_in(self, pool, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pools[pool], func, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("manifest", help="JSON file with the list of items")
+    parser.add_argument("--output-dir", default="reports")
+    parser.add_argument(
+        "--progress", help="Progress file, defaults to OUTPUT_DIR/progress.jsonl"
+    )
+    parser.add_argument("--model", help="Whisper model size")
+    parser.add_argument("--transcribe-workers", type=int)
+    parser.add_argument("--fetch-concurrency", type=int, default=8)
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--pdf-workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        items = json.load(f)
+
+    runner = BatchRunner(
+        args.output_dir,
+        args.progress,
+        args.model,
+        args.transcribe_workers,
+        args.fetch_concurrency,
+        args.llm_concurrency,
+        args.pdf_workers,
+    )
+    results = asyncio.run(runner.run(items))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares creating a summary and its title in two LLM calls (summarize_text, then
+create_title) with the single call of summarize_with_title. Example:
+
+    python benchmark_summary_title.py transcript.txt article.txt --runs 5
+
+Reports latency and OpenAI token usage per document for both paths. This calls the
+OpenAI API, so it needs OPENAI_API_KEY and costs tokens.
+"""
+
+import os
+import sys
+
+# Put the repository root on the path for the shared helpers in common/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import argparse
+import json
+import time
+
+from langchain.callbacks import get_openai_callback
+
+from common.benchmark import latency_stats
+from summaries_refactored import create_title, summarize_text, summarize_with_title
+
+
+def two_calls(text):
+    summary = summarize_text(text)
+    return summary, create_title(summary)
+
+
+def measure(func, texts, runs):
+    samples, tokens = [], []
+    for _ in range(runs):
+        for text in texts:
+            with get_openai_callback() as callback:
+                start = time.perf_counter()
+                func(text)
+                samples.append(time.perf_counter() - start)
+            tokens.append(callback.total_tokens)
+    return {
+        **latency_stats(samples),
+        "mean_tokens": sum(tokens) / len(tokens),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("texts", nargs="+", help="Text files to summarize")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = []
+    for path in args.texts:
+        with open(path) as f:
+            texts.append(f.read())
+
+    results = {
+        "two_calls": measure(two_calls, texts, args.runs),
+        "one_call": measure(summarize_with_title, texts, args.runs),
+    }
+    results["latency_saved_ms"] = (
+        results["two_calls"]["mean_ms"] - results["one_call"]["mean_ms"]
+    )
+    results["tokens_saved"] = (
+        results["two_calls"]["mean_tokens"] - results["one_call"]["mean_tokens"]
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+MARGIN_LEFT = 100
+MARGIN_RIGHT = 100
+MARGIN_TOP = 100
+MARGIN_BOTTOM = 72
+
+TITLE_FONT = ("Helvetica-Bold", 18, 20)  # Font name, size and line spacing
+BODY_FONT = ("Helvetica", 12, 14)
+
+
+@lru_cache(maxsize=65536)
+def text_width(text, font_name, font_size):
+    """Width of a text in points, cached since the same words come up again and again."""
+    return stringWidth(text, font_name, font_size)
+
+
+def split_long_word(word, max_width, font_name, font_size):
+    """Split a word that is wider than a line, like a URL, into pieces that fit."""
+    piece, piece_width = "", 0
+    for char in word:
+        char_width = text_width(char, font_name, font_size)
+        if piece and piece_width + char_width > max_width:
+            yield piece
+            piece, piece_width = "", 0
+        piece += char
+        piece_width += char_width
+    yield piece
+
+
+def wrap_text(text, max_width, font_name, font_size):
+    """
+    Wrap a text into lines that fit max_width points in the given font, keeping the
+    text's own line breaks.
+
+    Yields:
+        str: The lines, an empty one for each blank line in the text.
+    """
+    space_width = text_width(" ", font_name, font_size)
+    for paragraph in text.split("\n"):
+        line, line_width = [], 0
+        for word in paragraph.split():
+            pieces = [word]
+            if text_width(word, font_name, font_size) > max_width:
+                pieces = split_long_word(word, max_width, font_name, font_size)
+            for piece in pieces:
+                width = text_width(piece, font_name, font_size)
+                if line and line_width + space_width + width > max_width:
+                    yield " ".join(line)
+                    line, line_width = [], 0
+                line_width += width + (space_width if line else 0)
+                line.append(piece)
+        yield " ".join(line)
+
+
+class PageWriter:
+    """Draws lines of text from the top of the page down, starting a new page when it is full."""
+
+    def __init__(self, pdf, pagesize=letter):
+        self.pdf = pdf
+        self.width, self.height = pagesize
+        self.max_width = self.width - MARGIN_LEFT - MARGIN_RIGHT
+        self.y = self.height - MARGIN_TOP
+
+    def new_page(self):
+        self.pdf.showPage()
+        self.y = self.height - MARGIN_TOP
+
+    def skip(self, height):
+        self.y -= height
+        if self.y < MARGIN_BOTTOM:
+            self.new_page()
+
+    def write(self, text, font, indent=0):
+        font_name, font_size, leading = font
+        for line in wrap_text(text, self.max_width - indent, font_name, font_size):
+            if self.y < MARGIN_BOTTOM:
+                self.new_page()
+            self.pdf.setFont(font_name, font_size)
+            self.pdf.drawString(MARGIN_LEFT + indent, self.y, line)
+            self.y -= leading
+
+
+def render_summary_pdf(summary, title, participants, filename, date=None):
+    """
+    Render a summary with its title, date and participants to a PDF, over as many
+    pages as it needs. The file is written under a temporary name and then moved
+    into place, so a crashed render never leaves a half-written PDF behind.
+
+    Returns:
+        str: The filename.
+    """
+    date = date or datetime.now().strftime("%Y-%m-%d")
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+
+    pdf = canvas.Canvas(tmp_filename, pagesize=letter, pageCompression=1)
+    writer = PageWriter(pdf)
+    writer.write(title.replace("\n", " "), TITLE_FONT)
+    writer.skip(10)
+    writer.write(f"Date: {date}", BODY_FONT)
+    writer.skip(6)
+    writer.write("Participants:", BODY_FONT)
+    for participant in participants:
+        writer.write(participant, BODY_FONT, indent=20)
+    writer.skip(24)
+    writer.write(summary, BODY_FONT)
+    pdf.save()
+
+    os.replace(tmp_filename, filename)
+    return filename
+
+
+def _render_job(job):
+    return render_summary_pdf(**job)
+
+
+def render_batch(jobs, max_workers=None):
+    """
+    Render many summaries in parallel worker processes.
+
+    Args:
+        jobs (list): Dicts with the keyword arguments of render_summary_pdf.
+        max_workers (int): Number of processes, defaults to the number of CPU cores.
+
+    Returns:
+        list: The rendered filenames, in the order of the jobs.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_render_job, jobs, chunksize=8))
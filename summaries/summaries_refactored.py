@@ -1,5 +1,9 @@
-import whisper
+import contextvars
+import json
+import os
 import textwrap
+import tiktoken
+from concurrent.futures import ThreadPoolExecutor
 
 from langchain.chat_models import ChatOpenAI
 from langchain.chains.summarize import load_summarize_chain
@@ -7,73 +11,168 @@ from langchain.schema import Document
 from langchain.llms import OpenAI
 from langchain import PromptTemplate
 from langchain.chains import LLMChain
-from langchain.document_loaders import WebBaseLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from datetime import datetime
+from pdf_export import render_summary_pdf
+from transcription import transcribe_file, transcribe_segments
+from web_fetch import WebCache, WebFetcher, hash_text
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    Thread pool that runs each job in a copy of the submitting thread's context, so
+    callbacks tracked in context variables, like get_openai_callback, see its LLM calls.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        context = contextvars.copy_context()
+        return super().submit(context.run, fn, *args, **kwargs)
 
 
 # Transcribe audio
-def transcribe_audio(path):
-    model = whisper.load_model("base")
-    transcription = model.transcribe(audio=path, fp16=False)
-    return textwrap.fill(transcription["text"], width=50)
+def transcribe_audio(path, model_name=None):
+    return textwrap.fill(transcribe_file(path, model_name), width=50)
 
 
-# Summarize text
-def summarize_text(text):
+# Inputs longer than this are summarized in parallel chunks instead of in one prompt,
+# leaving room in the 16k context for the prompt and the summary
+MAX_STUFF_TOKENS = 12000
+
+map_prompt = PromptTemplate(
+    input_variables=["text"],
+    template="""Write a concise summary of the following part of a longer text:
+
+{text}
+
+CONCISE SUMMARY:""",
+)
+
+combine_prompt = PromptTemplate(
+    input_variables=["text"],
+    template="""The following are summaries of consecutive parts of a longer text.
+Combine them into one concise summary of the whole text:
+
+{text}
+
+CONCISE SUMMARY:""",
+)
+
+
+def count_tokens(text, model_name="gpt-3.5-turbo-16k"):
+    encoding = tiktoken.encoding_for_model(model_name)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def group_by_tokens(texts, max_tokens):
+    """Pack consecutive texts into groups of at most max_tokens, with at least two per group."""
+    groups, group, group_tokens = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if len(group) >= 2 and group_tokens + tokens > max_tokens:
+            groups.append(group)
+            group, group_tokens = [], 0
+        group.append(text)
+        group_tokens += tokens
+    groups.append(group)
+    return groups
+
+
+def summarize_long_text(text, chunk_size=4000, chunk_overlap=200, max_workers=4):
+    """
+    Map-reduce summary for texts that do not fit in one prompt. The text is split on
+    token boundaries, the chunks are summarized concurrently, and the summaries are
+    combined in a tree until a single summary is left.
+    """
     llm = ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo-16k")
-    chain = load_summarize_chain(llm, chain_type="stuff")
-    docs = [Document(page_content=text)]
-    return chain.run(docs)
+    map_chain = LLMChain(llm=llm, prompt=map_prompt)
+    combine_chain = LLMChain(llm=llm, prompt=combine_prompt)
+
+    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+    chunks = text_splitter.split_text(text)
 
+    with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+        summaries = list(executor.map(lambda chunk: map_chain.run(chunk), chunks))
+        return combine_summaries(summaries, combine_chain, executor)
+
+
+def combine_summaries(summaries, combine_chain, executor):
+    """Combine groups of summaries that fit in one prompt until one is left."""
+    while len(summaries) > 1:
+        groups = group_by_tokens(summaries, MAX_STUFF_TOKENS)
+        summaries = list(
+            executor.map(lambda group: combine_chain.run("\n\n".join(group)), groups)
+        )
+    return summaries[0]
 
-def summarize_web_content(url):
-    loader = WebBaseLoader(url)
-    docs = loader.load()
 
+def summarize_audio(path, model_name=None, chunk_size=4000, max_workers=4):
+    """
+    Transcribe and summarize a long recording at the same time. Whenever chunk_size
+    tokens of transcript have come in, the chunk's summary is started in the
+    background while transcription goes on.
+
+    Returns:
+        tuple: The summary, and the transcript segments with their timestamps.
+    """
     llm = ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo-16k")
-    chain = load_summarize_chain(llm, chain_type="stuff")
+    map_chain = LLMChain(llm=llm, prompt=map_prompt)
+    combine_chain = LLMChain(llm=llm, prompt=combine_prompt)
 
-    return chain.run(docs)
+    segments = []
+    with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures, chunk, chunk_tokens = [], [], 0
+        for segment in transcribe_segments(path, model_name):
+            segments.append(segment)
+            chunk.append(segment["text"])
+            chunk_tokens += count_tokens(segment["text"])
+            if chunk_tokens >= chunk_size:
+                futures.append(executor.submit(map_chain.run, " ".join(chunk)))
+                chunk, chunk_tokens = [], 0
 
+        # Short recordings fit in one prompt
+        if not futures:
+            return summarize_text(" ".join(chunk)), segments
 
-# Export to PDF
-def export_to_pdf(summary, title, participants, filename="summary.pdf"):
-    wrapped_summary = textwrap.fill(summary, width=75)
-    date_of_meeting = datetime.now().strftime("%Y-%m-%d")
+        if chunk:
+            futures.append(executor.submit(map_chain.run, " ".join(chunk)))
+        summaries = [future.result() for future in futures]
+        return combine_summaries(summaries, combine_chain, executor), segments
+
+
+# Summarize text
+def summarize_text(text):
+    if count_tokens(text) > MAX_STUFF_TOKENS:
+        return summarize_long_text(text)
+
+    llm = ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo-16k")
+    chain = load_summarize_chain(llm, chain_type="stuff")
+    docs = [Document(page_content=text)]
+    return chain.run(docs)
 
-    # Clean and wrap the title
-    title = title.replace("\n", " ")
-    wrapped_title = textwrap.fill(title, width=50)
 
-    c = canvas.Canvas(filename, pagesize=letter)
-    width, height = letter
+web_fetcher = WebFetcher(WebCache(os.environ.get("WEB_CACHE_DIR", ".cache/web")))
 
-    # Title
-    c.setFont("Helvetica-Bold", 18)
-    y_title = height - 100
-    for line in wrapped_title.split("\n"):
-        c.drawString(100, y_title, line)
-        y_title -= 20  # Adjust the line spacing as needed for the title
-    c.setFont("Helvetica", 12)
 
-    # Date
-    c.drawString(100, y_title - 30, f"Date: {date_of_meeting}")
+def load_web_content(url):
+    return web_fetcher.fetch(url).text
 
-    # Participants
-    c.drawString(100, y_title - 50, "Participants:")
-    for i, participant in enumerate(participants):
-        c.drawString(120, y_title - 70 - (i * 14), participant)
 
-    # Summary
-    y_summary = y_title - 150  # Adjust this value based on the title and participants
-    for line in wrapped_summary.split("\n"):
-        c.drawString(100, y_summary, line)
-        y_summary -= 14
+def summarize_web_content(url):
+    # Pages whose text has not changed reuse their summary instead of calling the LLM
+    page = web_fetcher.fetch(url)
+    cached = web_fetcher.cache.get_summary(page.content_hash)
+    if cached is not None:
+        return cached["summary"]
+    summary = summarize_text(page.text)
+    web_fetcher.cache.put_summary(page.content_hash, summary)
+    return summary
 
-    c.save()
+
+# Export to PDF
+def export_to_pdf(summary, title, participants, filename="summary.pdf"):
+    render_summary_pdf(summary, title, participants, filename)
 
 
 def create_title(summary):
@@ -90,17 +189,74 @@ def create_title(summary):
     return title
 
 
-# Example usage with MP3 file
-path = "./17 VS Code Tips That Will Change Your Data Science Workflow.mp3"
-participants = ["Alice", "Bob", "Charlie"]
+summary_and_title_prompt = PromptTemplate(
+    input_variables=["text"],
+    template="""Write a concise summary of the following text, and a title for the summary.
+
+{text}
+
+Respond with only a JSON object of the form {{"title": "...", "summary": "..."}}""",
+)
+
+
+def parse_json_reply(reply):
+    """Parse the JSON object in an LLM reply, ignoring any text or code fence around it."""
+    start, end = reply.find("{"), reply.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError(f"No JSON object in reply: {reply!r}")
+    return json.loads(reply[start : end + 1])
+
+
+def summarize_with_title(text):
+    """
+    Summarize a text and create its title in one LLM call, instead of sending the
+    summary back for the title in a second call. Falls back to summarize_text and
+    create_title when the text is too long for one prompt or the reply is not valid.
+
+    Returns:
+        tuple: The summary and the title.
+    """
+    if count_tokens(text) <= MAX_STUFF_TOKENS:
+        llm = ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo-16k")
+        chain = LLMChain(llm=llm, prompt=summary_and_title_prompt)
+        try:
+            result = parse_json_reply(chain.run(text))
+            summary, title = result["summary"], result["title"]
+            if isinstance(summary, str) and isinstance(title, str):
+                return summary, title.replace("\n", " ").strip()
+        except (ValueError, KeyError, TypeError):
+            pass
+
+    summary = summarize_text(text)
+    return summary, create_title(summary)
+
+
+def summarize_page_with_title(text):
+    """
+    summarize_with_title for the text of a web page. The summary and title are cached
+    by a hash of the text, so a page that has not changed skips the LLM call.
+    """
+    if not text.strip():
+        raise ValueError("No text to summarize")
+    content_hash = hash_text(text)
+    cached = web_fetcher.cache.get_summary(content_hash)
+    if cached is not None and cached.get("title"):
+        return cached["summary"], cached["title"]
+    summary, title = summarize_with_title(text)
+    web_fetcher.cache.put_summary(content_hash, summary, title)
+    return summary, title
+
+
+if __name__ == "__main__":
+    # Example usage with MP3 file
+    path = "./17 VS Code Tips That Will Change Your Data Science Workflow.mp3"
+    participants = ["Alice", "Bob", "Charlie"]
 
-transcription = transcribe_audio(path)
-summary = summarize_text(transcription)
-title = create_title(summary)
-export_to_pdf(summary, title, participants, filename="summary-audio.pdf")
+    transcription = transcribe_audio(path)
+    summary, title = summarize_with_title(transcription)
+    export_to_pdf(summary, title, participants, filename="summary-audio.pdf")
 
-# Example usage with Web URL
-web_url = "https://termene.ro/"
-summary = summarize_web_content(web_url)
-title = create_title(summary)
-export_to_pdf(summary, title, participants=[], filename="summary-web.pdf")
+    # Example usage with Web URL
+    web_url = "https://termene.ro/"
+    summary, title = summarize_page_with_title(load_web_content(web_url))
+    export_to_pdf(summary, title, participants=[], filename="summary-web.pdf")
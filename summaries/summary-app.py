@@ -1,4 +1,3 @@
-import whisper
 import textwrap
 
 from langchain.chat_models import ChatOpenAI
@@ -9,11 +8,13 @@ from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from datetime import datetime
 
+from transcription import get_whisper_model
+
 # --------------------------------------------------------------
 # Transcribe audio
 # --------------------------------------------------------------
 
-model = whisper.load_model("base")
+model = get_whisper_model("base")
 
 path = "./17 VS Code Tips That Will Change Your Data Science Workflow.mp3"
 
@@ -0,0 +1,312 @@
+import math
+import os
+import subprocess
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import torch
+import whisper
+
+from transcription_cache import TranscriptionCache
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".flac", ".ogg", ".webm", ".mp4")
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE
+
+# Loaded models by name, shared by everything in the process
+_models = {}
+_models_lock = threading.Lock()
+
+transcription_cache = TranscriptionCache(
+    os.environ.get("TRANSCRIPTION_CACHE_DIR", ".cache/transcriptions")
+)
+
+
+def resolve_model_name(model_name=None):
+    return model_name or os.environ.get("WHISPER_MODEL", "base")
+
+
+def get_whisper_model(model_name=None, num_threads=None):
+    """
+    Return the whisper model, loading it on first use only.
+
+    Args:
+        model_name (str): Model size, e.g. "base" or "small". Defaults to the
+            WHISPER_MODEL environment variable, or "base".
+        num_threads (int): Number of CPU threads torch may use for inference.
+
+    Returns:
+        whisper.Whisper: The loaded model.
+    """
+    model_name = resolve_model_name(model_name)
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    with _models_lock:
+        if model_name not in _models:
+            _models[model_name] = whisper.load_model(model_name)
+        return _models[model_name]
+
+
+def _transcribe(path, model_name=None):
+    model = get_whisper_model(model_name)
+    transcription = model.transcribe(audio=path, fp16=False)
+    segments = [
+        {"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+        for segment in transcription["segments"]
+    ]
+    return {"text": transcription["text"], "segments": segments}
+
+
+def transcribe_file(path, model_name=None, use_cache=True):
+    """
+    Transcribe an audio file, or return the cached text if the same audio was
+    transcribed with the same model before.
+    """
+    model_name = resolve_model_name(model_name)
+    key = transcription_cache.make_key(path, model_name, mode="file")
+    transcription = transcription_cache.get(key) if use_cache else None
+    if transcription is None:
+        transcription = _transcribe(path, model_name)
+        transcription_cache.put(key, transcription)
+    return transcription["text"]
+
+
+def _init_worker(model_name, num_threads):
+    # Load the model once when the worker starts, not for each file
+    get_whisper_model(model_name, num_threads)
+
+
+def _worker_settings(max_workers, jobs=None):
+    """Default number of worker processes, and the torch threads each of them gets."""
+    cpu_count = os.cpu_count() or 1
+    max_workers = max_workers or max(1, cpu_count // 4)
+    if jobs is not None:
+        max_workers = min(max_workers, jobs)
+    # Split the cores between the workers so they don't compete for them
+    return max_workers, max(1, cpu_count // max_workers)
+
+
+def create_transcription_pool(model_name=None, max_workers=None, jobs=None):
+    """
+    Create a process pool for transcription whose workers each load the model once,
+    when they start, and keep it for all of their jobs.
+    Returns:
+        tuple: The ProcessPoolExecutor and its number of workers.
+    """
+    max_workers, num_threads = _worker_settings(max_workers, jobs)
+    executor = ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(model_name, num_threads),
+    )
+    return executor, max_workers
+
+
+def find_audio_files(directory):
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(AUDIO_EXTENSIONS)
+    )
+
+
+def transcribe_directory(directory, model_name=None, max_workers=None, use_cache=True):
+    """
+    Transcribe every audio file in a directory with a pool of worker processes,
+    each of which loads the model once and keeps it for all of its files.
+
+    Args:
+        directory (str): Directory with the audio files.
+        model_name (str): Whisper model size, see get_whisper_model.
+        max_workers (int): Number of worker processes. Every worker holds its own copy
+            of the model, so keep this low for the larger models. Defaults to a
+            quarter of the CPU cores.
+
+        use_cache (bool): Skip files that were transcribed before, see transcribe_file.
+
+    Returns:
+        dict: The transcribed text by file path.
+    """
+    model_name = resolve_model_name(model_name)
+    texts, misses = {}, {}
+    for path in find_audio_files(directory):
+        key = transcription_cache.make_key(path, model_name, mode="file")
+        transcription = transcription_cache.get(key) if use_cache else None
+        if transcription is None:
+            misses[path] = key
+        else:
+            texts[path] = transcription["text"]
+
+    # Only start workers, and load models, for audio that is not cached
+    if misses:
+        executor, _ = create_transcription_pool(model_name, max_workers, len(misses))
+        with executor:
+            transcriptions = executor.map(_transcribe, misses, repeat(model_name))
+            for (path, key), transcription in zip(misses.items(), transcriptions):
+                transcription_cache.put(key, transcription)
+                texts[path] = transcription["text"]
+
+    return dict(sorted(texts.items()))
+
+
+def stream_audio(path, block_seconds=60):
+    """
+    Decode an audio file with ffmpeg and yield it in blocks of mono 16 kHz samples,
+    so long recordings are never held in memory as a whole.
+    Raises a RuntimeError with ffmpeg's error output if the file cannot be decoded.
+    """
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-loglevel",
+        "error",
+        "-i",
+        path,
+        "-f",
+        "s16le",
+        "-ac",
+        "1",
+        "-acodec",
+        "pcm_s16le",
+        "-ar",
+        str(SAMPLE_RATE),
+        "-",
+    ]
+    block_size = block_seconds * SAMPLE_RATE * 2
+    # stderr goes to a file, a pipe nobody reads while decoding could fill up and block
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            while True:
+                data = process.stdout.read(block_size)
+                if not data:
+                    break
+                yield np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+
+            if process.wait() != 0:
+                stderr.seek(0)
+                error = stderr.read().decode("utf-8", errors="replace").strip()
+                raise RuntimeError(f"Failed to load audio {path}: {error[-1000:]}")
+        finally:
+            # The caller may stop reading before the end of the file
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            process.stdout.close()
+
+
+def find_quietest_sample(audio, frame_seconds=0.1):
+    """Return the start of the frame with the lowest energy in audio."""
+    frame_size = int(SAMPLE_RATE * frame_seconds)
+    num_frames = max(len(audio) // frame_size, 1)
+    frames = audio[: num_frames * frame_size].reshape(num_frames, -1)
+    return int((frames**2).mean(axis=1).argmin()) * frame_size
+
+
+def split_on_silence(path, segment_seconds=60, search_seconds=5, overlap_seconds=1):
+    """
+    Split an audio file into segments of about segment_seconds, cut at the quietest
+    point within search_seconds of the target length. Each segment starts
+    overlap_seconds before the previous cut, so words at a cut are not lost.
+
+    Yields:
+        tuple: (offset, keep_from, keep_until, audio), where offset is the start of the
+            segment in seconds and the segment's transcript is kept between keep_from
+            and keep_until seconds, the previous and the next cut.
+    """
+    target = segment_seconds * SAMPLE_RATE
+    search = search_seconds * SAMPLE_RATE
+    overlap = overlap_seconds * SAMPLE_RATE
+
+    buffer = np.zeros(0, np.float32)
+    buffer_start = 0  # Position of buffer[0] in the recording, in samples
+    previous_cut = 0
+    for block in stream_audio(path):
+        buffer = np.concatenate([buffer, block])
+        while len(buffer) >= target + search:
+            cut = (
+                target
+                - search
+                + find_quietest_sample(buffer[target - search : target + search])
+            )
+            yield (
+                buffer_start / SAMPLE_RATE,
+                previous_cut / SAMPLE_RATE,
+                (buffer_start + cut) / SAMPLE_RATE,
+                buffer[:cut],
+            )
+            previous_cut = buffer_start + cut
+            buffer = buffer[cut - overlap :]
+            buffer_start += cut - overlap
+
+    if len(buffer):
+        yield buffer_start / SAMPLE_RATE, previous_cut / SAMPLE_RATE, math.inf, buffer
+
+
+def transcribe_segment(segment, model_name=None):
+    """
+    Transcribe one segment from split_on_silence.
+    Returns:
+        list: Whisper's segments inside the kept range, with timestamps in the recording.
+    """
+    offset, keep_from, keep_until, audio = segment
+    model = get_whisper_model(model_name)
+    transcription = model.transcribe(audio=audio, fp16=False)
+
+    segments = []
+    for result in transcription["segments"]:
+        start, end = offset + result["start"], offset + result["end"]
+        # The overlap is transcribed twice, keep each part from one side of the cut only
+        if keep_from <= (start + end) / 2 < keep_until:
+            segments.append(
+                {"start": start, "end": end, "text": result["text"].strip()}
+            )
+    return segments
+
+
+def transcribe_segments(
+    path, model_name=None, max_workers=None, segment_seconds=60, use_cache=True
+):
+    """
+    Transcribe a long recording by splitting it on silence and transcribing the
+    segments in parallel worker processes. Segments are yielded in order as soon as
+    they are done, so the caller can start working on the text before the whole
+    recording is transcribed. At most two segments per worker are decoded ahead.
+
+    Cached transcriptions are yielded straight away, and a new one is cached once all
+    of its segments have been yielded.
+
+    Yields:
+        dict: A transcript segment with its start and end in seconds and its text.
+    """
+    model_name = resolve_model_name(model_name)
+    key = transcription_cache.make_key(
+        path, model_name, mode="segments", segment_seconds=segment_seconds
+    )
+    transcription = transcription_cache.get(key) if use_cache else None
+    if transcription is not None:
+        yield from transcription["segments"]
+        return
+
+    segments = []
+    executor, max_workers = create_transcription_pool(model_name, max_workers)
+    try:
+        pending = deque()
+        for segment in split_on_silence(path, segment_seconds):
+            pending.append(executor.submit(transcribe_segment, segment, model_name))
+            if len(pending) >= 2 * max_workers:
+                result = pending.popleft().result()
+                segments.extend(result)
+                yield from result
+        while pending:
+            result = pending.popleft().result()
+            segments.extend(result)
+            yield from result
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    text = " ".join(segment["text"] for segment in segments)
+    transcription_cache.put(key, {"text": text, "segments": segments})
@@ -0,0 +1,54 @@
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+def fingerprint_audio(path, block_size=1 << 20):
+    """Return the SHA-256 of an audio file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TranscriptionCache:
+    """
+    On-disk cache of transcriptions, keyed by the audio content plus the whisper
+    model and options that produced them, so renamed or copied files still hit.
+
+    Each entry is a gzip-compressed JSON file with the text and the timestamped
+    segments of one transcription.
+    """
+
+    def __init__(self, cache_dir=".cache/transcriptions"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def make_key(self, path, model_name, **options):
+        raw = json.dumps([fingerprint_audio(path), model_name, options], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Load a cached transcription, or return None if it is not stored."""
+        try:
+            with gzip.open(self.cache_dir / f"{key}.json.gz", "rt") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, transcription):
+        """
+        Save a transcription, a dict with its "text" and "segments". Empty ones are not
+        saved, so audio that could not be decoded is tried again the next time.
+        """
+        if not transcription["segments"]:
+            return
+        path = self.cache_dir / f"{key}.json.gz"
+        # Several worker processes may write at once, each to its own temporary file
+        tmp_path = self.cache_dir / f"{key}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt") as f:
+            json.dump(transcription, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,243 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+Page = namedtuple("Page", ["url", "text", "content_hash", "changed"])
+
+# Tags whose content is never part of the readable text of a page
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe"}
+# Page boilerplate, left out unless the page has no other text
+BOILERPLATE_TAGS = {"nav", "header", "footer", "aside"}
+# A header inside these is the heading of the content, not of the site
+CONTENT_TAGS = {"article", "main"}
+BLOCK_TAGS = {
+    "p",
+    "div",
+    "section",
+    "article",
+    "main",
+    "li",
+    "ul",
+    "ol",
+    "table",
+    "tr",
+    "br",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "blockquote",
+    "pre",
+}
+
+
+class TextExtractor(HTMLParser):
+    def __init__(self, skip_boilerplate=True):
+        super().__init__()
+        self.skip_boilerplate = skip_boilerplate
+        self.parts = []
+        self.skipped = []  # Open tags whose content is left out
+        self.content_depth = 0
+
+    def skips(self, tag):
+        if tag in SKIP_TAGS:
+            return True
+        if not self.skip_boilerplate or tag not in BOILERPLATE_TAGS:
+            return False
+        return not (tag == "header" and self.content_depth)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in CONTENT_TAGS:
+            self.content_depth += 1
+        if self.skips(tag):
+            self.skipped.append(tag)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in CONTENT_TAGS:
+            self.content_depth = max(self.content_depth - 1, 0)
+        if tag in self.skipped:
+            # Close the innermost skipped tag of this name
+            del self.skipped[len(self.skipped) - 1 - self.skipped[::-1].index(tag)]
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skipped:
+            self.parts.append(data)
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def decode_html(response):
+    """
+    Decode a page with the charset from the Content-Type header, then the one from a
+    <meta charset> tag, and otherwise the encoding guessed from the content. Unlike
+    response.text, pages without a charset header are not read as ISO-8859-1.
+    """
+    candidates = []
+    match = re.search(
+        r"charset=[\"']?([\w.:-]+)", response.headers.get("Content-Type", "")
+    )
+    if match:
+        candidates.append(match.group(1))
+    match = re.search(
+        rb"<meta[^>]+charset=[\"']?([\w.:-]+)", response.content[:4096], re.I
+    )
+    if match:
+        candidates.append(match.group(1).decode("ascii"))
+    candidates.append(response.apparent_encoding or "utf-8")
+
+    for encoding in candidates:
+        try:
+            return response.content.decode(encoding)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return response.content.decode("utf-8", errors="replace")
+
+
+def extract_text(html, skip_boilerplate=True):
+    parser = TextExtractor(skip_boilerplate)
+    parser.feed(html)
+    parser.close()
+    lines = (" ".join(line.split()) for line in "".join(parser.parts).split("\n"))
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def html_to_text(html):
+    """
+    Extract the readable text of an HTML page, leaving out scripts, styles and the
+    navigation, header, footer and sidebar boilerplate so they are not sent to the
+    LLM. A page whose only text is in that boilerplate gets it back instead of "".
+    """
+    return extract_text(html) or extract_text(html, skip_boilerplate=False)
+
+
+class WebCache:
+    """
+    On-disk cache of fetched pages and their summaries.
+
+    For every URL it keeps the ETag and Last-Modified headers with the extracted text,
+    so the page can be revalidated with a conditional GET. Summaries are stored by a
+    hash of the text they summarize, so an unchanged page reuses its summary.
+    """
+
+    def __init__(self, cache_dir=".cache/web"):
+        self.cache_dir = Path(cache_dir)
+        (self.cache_dir / "pages").mkdir(parents=True, exist_ok=True)
+        (self.cache_dir / "summaries").mkdir(parents=True, exist_ok=True)
+
+    def _write(self, path, data):
+        # Write to a temporary file first so readers never see a half-written entry
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with gzip.open(tmp_path, "wt") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _read(self, path):
+        try:
+            with gzip.open(path, "rt") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _page_path(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / "pages" / f"{key}.json.gz"
+
+    def get_page(self, url):
+        return self._read(self._page_path(url))
+
+    def put_page(self, url, entry):
+        self._write(self._page_path(url), entry)
+
+    def get_summary(self, content_hash):
+        """
+        Returns:
+            dict: The cached "summary", with its "title" if one was made, or None.
+        """
+        return self._read(self.cache_dir / "summaries" / f"{content_hash}.json.gz")
+
+    def put_summary(self, content_hash, summary, title=None):
+        path = self.cache_dir / "summaries" / f"{content_hash}.json.gz"
+        self._write(path, {"summary": summary, "title": title})
+
+
+class WebFetcher:
+    """
+    Fetches pages through one pooled HTTP session and revalidates cached pages with
+    If-None-Match and If-Modified-Since, so unchanged pages are not downloaded again.
+    """
+
+    def __init__(self, cache=None, timeout=30, pool_size=16):
+        self.cache = cache or WebCache()
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "Mozilla/5.0 (compatible; summaries)"
+
+    def fetch(self, url):
+        """
+        Returns:
+            Page: The page's text, a hash of it, and whether the server sent a new version.
+        Raises a ValueError if the page has no readable text.
+        """
+        cached = self.cache.get_page(url)
+        headers = {}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached:
+            return Page(url, cached["text"], cached["content_hash"], False)
+        response.raise_for_status()
+
+        text = html_to_text(decode_html(response))
+        if not text:
+            raise ValueError(f"No readable text in {url}")
+        content_hash = hash_text(text)
+        self.cache.put_page(
+            url,
+            {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "text": text,
+                "content_hash": content_hash,
+            },
+        )
+        changed = not cached or cached["content_hash"] != content_hash
+        return Page(url, text, content_hash, changed)
+
+    def fetch_many(self, urls, max_workers=8):
+        """
+        Fetch several pages concurrently over the shared session.
+        Returns:
+            dict: The Page, or the exception raised while fetching it, by URL.
+        """
+
+        def fetch_or_error(url):
+            try:
+                return self.fetch(url)
+            except (requests.RequestException, ValueError) as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(urls, executor.map(fetch_or_error, urls)))
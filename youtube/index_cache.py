@@ -0,0 +1,69 @@
+import hashlib
+import os
+import pickle
+import shutil
+from pathlib import Path
+
+import faiss
+from langchain.vectorstores import FAISS
+
+
+class FaissIndexCache:
+    """
+    On-disk cache of FAISS indexes, keyed by a source ID (e.g. a YouTube video ID)
+    plus the text splitter settings that produced the chunks.
+
+    Each entry is a folder holding the files written by FAISS.save_local
+    (index.faiss and index.pkl). Entries are memory-mapped on reload where the
+    index type supports it, and the least recently used entries are evicted once
+    more than max_entries are stored.
+    """
+
+    def __init__(self, cache_dir=".cache/faiss", max_entries=50):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+
+    def make_key(self, source_id, chunk_size, chunk_overlap):
+        raw = f"{source_id}:{chunk_size}:{chunk_overlap}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key, embeddings):
+        """Load a cached index, or return None if it is not stored."""
+        path = self.cache_dir / key
+        index_file = path / "index.faiss"
+        if not index_file.exists():
+            return None
+
+        try:
+            index = faiss.read_index(str(index_file), faiss.IO_FLAG_MMAP)
+        except RuntimeError:
+            # Not every index type can be memory-mapped, read it into memory instead
+            index = faiss.read_index(str(index_file))
+
+        with open(path / "index.pkl", "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+
+        # Touch the entry so it counts as recently used
+        os.utime(path)
+        return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+    def put(self, key, db):
+        """Save an index to the cache and evict the oldest entries if needed."""
+        path = self.cache_dir / key
+        tmp_path = self.cache_dir / f"{key}.tmp"
+        db.save_local(str(tmp_path))
+        # Write to a temporary folder first so readers never see a half-written entry
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = [
+            p
+            for p in self.cache_dir.iterdir()
+            if p.is_dir() and not p.name.endswith(".tmp")
+        ]
+        entries.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        for path in entries[self.max_entries :]:
+            shutil.rmtree(path, ignore_errors=True)
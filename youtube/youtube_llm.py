@@ -1,3 +1,9 @@
+import os
+import sys
+
+# Put the repository root on the path for the shared helpers in common/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 from langchain.document_loaders import YoutubeLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings.openai import OpenAIEmbeddings
@@ -8,18 +14,34 @@ from langchain.chains import LLMChain
 from dotenv import find_dotenv, load_dotenv
 import textwrap
 
+from index_cache import FaissIndexCache
+from common.embedding_cache import CachedEmbeddings
+
 load_dotenv(find_dotenv())
-embeddings = OpenAIEmbeddings()
+embeddings = CachedEmbeddings(OpenAIEmbeddings())
+index_cache = FaissIndexCache()
 
 
 def create_db_from_youtube_video_url(video_url: str) -> FAISS:
+    chunk_size, chunk_overlap = 1000, 100
+
+    # Reuse the index if this video was already embedded with the same splitter settings
+    video_id = YoutubeLoader.extract_video_id(video_url)
+    key = index_cache.make_key(video_id, chunk_size, chunk_overlap)
+    db = index_cache.get(key, embeddings)
+    if db is not None:
+        return db
+
     loader = YoutubeLoader.from_youtube_url(video_url)
     transcript = loader.load()
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
     docs = text_splitter.split_documents(transcript)
 
     db = FAISS.from_documents(docs, embeddings)
+    index_cache.put(key, db)
     return db
 
 